@@ -3,25 +3,107 @@ FastAPI routes for Vanna SQL Service
 """
 import logging
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, status
+from typing import Any, Dict
+
+import orjson
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic_core import to_jsonable_python
 
 from ..models import (
     SQLGenerationRequest,
     SQLGenerationResponse,
     SchemaTrainingRequest,
     SchemaTrainingResponse,
+    TrainingJobResponse,
     HealthResponse,
     SchemaResponse,
     SchemaInfo
 )
-from ..services import vanna_service
+from ..services import (
+    vanna_service, sql_cache, semantic_sql_cache, generation_coalescer, training_jobs, schema_cache,
+    clear_training_caches
+)
+from ..services.schema_cache import CachedResponse, etag_matches
 from ..database import db_manager
 from ..config import settings
 
+# Arrow IPC responses are optional; pyarrow is not a required dependency
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
 logger = logging.getLogger(__name__)
 
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
 router = APIRouter()
 
+# Every SQLGenerationResponse field, so direct encoding keeps the same shape
+_RESPONSE_DEFAULTS = dict.fromkeys(SQLGenerationResponse.model_fields)
+
+# NDJSON rows per chunk written to the socket by /api/query/stream
+_STREAM_CHUNK_ROWS = 100
+
+
+def _json_response(fields: Dict[str, Any]) -> Response:
+    """
+    Encode a SQLGenerationResponse-shaped dict with orjson.
+    
+    Types orjson does not handle natively (Decimal, timedelta, ...) fall
+    back to pydantic's JSON conversion, so values render as they would
+    through the response model.
+    """
+    content = orjson.dumps(
+        {**_RESPONSE_DEFAULTS, **fields},
+        default=to_jsonable_python,
+        option=orjson.OPT_NON_STR_KEYS
+    )
+    return Response(content=content, media_type="application/json")
+
+
+def _arrow_column(values: list) -> "pa.Array":
+    """Build an Arrow array, falling back to strings for types Arrow can't infer (UUID, ...)"""
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+
+
+def _arrow_response(result: Dict[str, Any]) -> Response:
+    """
+    Encode a columnar read result as one Arrow IPC stream record batch.
+    
+    Values are copied straight from the row tuples into contiguous column
+    buffers, with no per-row dict. The generated SQL travels in the schema
+    metadata.
+    """
+    columns, rows = result['columns'], result['results']
+    if rows:
+        arrays = [_arrow_column(list(values)) for values in zip(*rows)]
+    else:
+        arrays = [pa.array([], type=pa.null()) for _ in columns]
+    
+    batch = pa.RecordBatch.from_arrays(arrays, names=columns)
+    batch = batch.replace_schema_metadata({"sql": result['sql']})
+    
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return Response(content=sink.getvalue().to_pybytes(), media_type=ARROW_STREAM_MEDIA_TYPE)
+
+
+def _cached_json_response(request: Request, entry: CachedResponse) -> Response:
+    """Serve a cached body, or 304 when the client already has this ETag"""
+    headers = {
+        "ETag": entry.etag,
+        "Cache-Control": f"private, max-age={settings.SCHEMA_RESPONSE_CACHE_TTL}"
+    }
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=entry.payload, media_type="application/json", headers=headers)
+
 
 @router.get("/health", response_model=HealthResponse)
 async def health_check():
@@ -39,6 +121,149 @@ async def health_check():
     )
 
 
+async def _generate(request: SQLGenerationRequest) -> Dict[str, Any]:
+    """Phases 1-2 of _run_generation: prepare context, then call the LLM"""
+    similar_example = None
+    if settings.SQL_CACHE_ENABLED and settings.SEMANTIC_CACHE_ENABLED and request.use_cache:
+        similar_example = semantic_sql_cache.exemplar(
+            request.question, (request.context, request.role, request.user_id)
+        )
+    
+    try:
+        generation_context = await vanna_service.prepare_context(
+            question=request.question,
+            context=request.context,
+            role=request.role,
+            user_id=request.user_id,
+            similar_example=similar_example
+        )
+    except Exception as e:
+        logger.error(f"Failed to prepare generation context: {e}")
+        return {"success": False, "error": str(e)}
+    
+    return await vanna_service.generate_sql_from_context(generation_context)
+
+
+async def _run_generation(request: SQLGenerationRequest) -> Dict[str, Any]:
+    """
+    Generate (and optionally execute) SQL in three phases so no pool
+    connection is held across the LLM round trip:
+    
+    1. prepare_context - short DB/memory lookups, connections released
+    2. generate_sql_from_context - LLM call, no connection held
+    3. execute_prepared - fresh acquire just for execution
+    
+    Phases 1-2 go through the SQL caches (see _generate_cached).
+    """
+    if not vanna_service.initialized:
+        return {"success": False, "error": "Vanna Agent not initialized"}
+    
+    result = await _generate_cached(request)
+    
+    if request.execute and result['success']:
+        result = await vanna_service.execute_prepared(
+            result,
+            max_rows=request.max_rows,
+            result_format=request.result_format,
+            user_id=request.user_id
+        )
+    
+    return result
+
+
+async def _generate_cached(request: SQLGenerationRequest) -> Dict[str, Any]:
+    """
+    Phases 1-2, skipped when read-only SQL for the same question, context,
+    role and user is in the SQL cache. Generate-only requests may also
+    reuse SQL from a near-identical earlier question, or join an identical
+    one still being generated.
+    """
+    cache_key = None
+    result = None
+    scope = (request.context, request.role, request.user_id)
+    if settings.SQL_CACHE_ENABLED and request.use_cache:
+        cache_key = sql_cache.make_key(request.question, *scope)
+        result = sql_cache.get(cache_key)
+        if result is not None:
+            logger.info(f"SQL cache hit for: {request.question}")
+        elif settings.SEMANTIC_CACHE_ENABLED and not request.execute and request.max_rows is None:
+            # Approximate matches only for generate-only requests, where the
+            # caller sees the SQL before anything runs
+            result = semantic_sql_cache.get(request.question, scope)
+            if result is not None:
+                logger.info(
+                    f"Semantic SQL cache hit for: {request.question} "
+                    f"(similarity {result['metadata']['cache_similarity']})"
+                )
+    
+    if result is None:
+        if request.execute or not request.use_cache:
+            # Callers who opted out of reuse get a generation of their own
+            result = await _generate(request)
+        else:
+            # Identical generate-only requests already in flight share one
+            # LLM round trip instead of each starting their own
+            result = await generation_coalescer.submit(
+                cache_key or sql_cache.make_key(request.question, *scope),
+                lambda: _generate(request)
+            )
+        
+        # Only read-only SQL is reused; writes are always regenerated
+        if cache_key and result['success'] and vanna_service.is_read_only_sql(result['sql']):
+            sql_cache.put(cache_key, result)
+            semantic_sql_cache.put(request.question, scope, result)
+    
+    return result
+
+
+def _generation_response(request: SQLGenerationRequest, result: Dict[str, Any]):
+    """Shape a _run_generation result into the endpoint response"""
+    if result['success']:
+        # Merge service metadata with request context
+        service_metadata = result.get('metadata', {})
+        merged_metadata = {
+            **service_metadata,  # Include security validation metadata
+            "operation": result.get('operation'),
+            "rows_affected": result.get('rows_affected'),
+            "context": request.context,
+            "requested_role": request.role  # Role passed in request (may differ from resolved)
+        }
+        
+        response_fields = dict(
+            success=True,
+            sql=result.get('sql'),
+            columns=result.get('columns'),
+            results=result.get('results'),
+            row_count=result.get('row_count'),
+            # Multi-query fields
+            query_count=result.get('query_count'),
+            query_results=result.get('query_results'),
+            total_row_count=result.get('total_row_count'),
+            successful_queries=result.get('successful_queries'),
+            failed_queries=result.get('failed_queries'),
+            operation=result.get('operation'),
+            # Common fields
+            execution_time=result.get('execution_time'),
+            explanation=result.get('explanation'),
+            metadata=merged_metadata
+        )
+        
+        # Executed results can carry thousands of rows; skip per-row model
+        # validation and encode them directly
+        if request.execute:
+            return _json_response(response_fields)
+        return SQLGenerationResponse(**response_fields)
+    else:
+        # Include error metadata for failed requests
+        error_metadata = result.get('metadata', {})
+        return SQLGenerationResponse(
+            success=False,
+            error=result.get('error'),
+            sql=result.get('sql'),
+            metadata=error_metadata
+        )
+
+
 @router.post("/api/generate-sql", response_model=SQLGenerationResponse)
 async def generate_sql(request: SQLGenerationRequest):
     """
@@ -50,64 +275,13 @@ async def generate_sql(request: SQLGenerationRequest):
     - **role**: User role for RBAC
     - **execute**: Whether to execute the generated SQL
     - **max_rows**: Maximum rows to return (if executing)
+    - **result_format**: 'records' (default) or 'columnar' row layout
     """
     try:
-        if request.execute:
-            # Generate and execute
-            result = await vanna_service.generate_and_execute_sql(
-                question=request.question,
-                context=request.context,
-                role=request.role,
-                user_id=request.user_id,
-                max_rows=request.max_rows
-            )
-        else:
-            # Generate only
-            result = await vanna_service.generate_sql(
-                question=request.question,
-                context=request.context,
-                role=request.role,
-                user_id=request.user_id
-            )
+        result = await _run_generation(request)
+        
+        return _generation_response(request, result)
         
-        if result['success']:
-            # Merge service metadata with request context
-            service_metadata = result.get('metadata', {})
-            merged_metadata = {
-                **service_metadata,  # Include security validation metadata
-                "operation": result.get('operation'),
-                "rows_affected": result.get('rows_affected'),
-                "context": request.context,
-                "requested_role": request.role  # Role passed in request (may differ from resolved)
-            }
-            
-            return SQLGenerationResponse(
-                success=True,
-                sql=result.get('sql'),
-                results=result.get('results'),
-                row_count=result.get('row_count'),
-                # Multi-query fields
-                query_count=result.get('query_count'),
-                query_results=result.get('query_results'),
-                total_row_count=result.get('total_row_count'),
-                successful_queries=result.get('successful_queries'),
-                failed_queries=result.get('failed_queries'),
-                operation=result.get('operation'),
-                # Common fields
-                execution_time=result.get('execution_time'),
-                explanation=result.get('explanation'),
-                metadata=merged_metadata
-            )
-        else:
-            # Include error metadata for failed requests
-            error_metadata = result.get('metadata', {})
-            return SQLGenerationResponse(
-                success=False,
-                error=result.get('error'),
-                sql=result.get('sql'),
-                metadata=error_metadata
-            )
-            
     except Exception as e:
         logger.error(f"Error in generate_sql endpoint: {e}")
         raise HTTPException(
@@ -124,13 +298,31 @@ async def train_schema(request: SchemaTrainingRequest):
     - **schema_name**: Context name (e.g., 'leaves', 'assets')
     - **tables**: Specific tables to train on (optional)
     - **include_sample_data**: Include sample questions
+    - **background**: Return a job_id immediately; poll GET /api/train-schema/{job_id}
     """
     try:
+        # Training is the explicit refresh point for cached introspection
+        # and for SQL generated against the previous training context
+        db_manager.invalidate_schema_cache()
+        clear_training_caches()
+        
+        if request.background:
+            job = training_jobs.start(tables=request.tables, schema_name=request.schema_name)
+            return SchemaTrainingResponse(
+                success=True,
+                message="Training started",
+                tables_trained=[],
+                job_id=job.job_id
+            )
+        
         result = await vanna_service.train_on_database_schema(
             tables=request.tables,
             schema_name=request.schema_name
         )
         
+        # SQL generated while training was in progress saw partial context
+        clear_training_caches()
+        
         if result['success']:
             return SchemaTrainingResponse(
                 success=True,
@@ -154,28 +346,62 @@ async def train_schema(request: SchemaTrainingRequest):
         )
 
 
+@router.get("/api/train-schema/{job_id}", response_model=TrainingJobResponse)
+async def get_training_job(job_id: str):
+    """Get progress of a background training job"""
+    job = training_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Training job {job_id} not found"
+        )
+    return TrainingJobResponse(**job.to_dict())
+
+
 @router.get("/api/schema", response_model=SchemaResponse)
-async def get_schema(schema_name: str = "public"):
-    """Get database schema information"""
+async def get_schema(http_request: Request, schema_name: str = "public"):
+    """
+    Get database schema information
+    
+    Complete responses are cached with an ETag until the next training run
+    (or SCHEMA_RESPONSE_CACHE_TTL); send If-None-Match to get 304.
+    """
+    cache_key = ("schema", schema_name)
+    entry = schema_cache.get(cache_key)
+    if entry is not None:
+        return _cached_json_response(http_request, entry)
+    
     try:
         tables = await db_manager.get_all_tables(schema_name)
         
+        # Describe up to SCHEMA_MAX_TABLES tables (0 = all) in one bulk lookup
+        limit = settings.SCHEMA_MAX_TABLES or None
+        schema_infos = await db_manager.get_tables_schema_bulk(tables[:limit], schema_name)
         table_infos = []
-        for table_name in tables[:20]:  # Limit to first 20 tables
-            schema_info = await db_manager.get_table_schema(table_name)
+        warnings = []
+        for schema_info in schema_infos:
+            if schema_info.get('error'):
+                warnings.append(f"{schema_info['table_name']}: {schema_info['error']}")
             table_infos.append(SchemaInfo(
                 table_name=schema_info['table_name'],
                 columns=schema_info['columns'],
                 row_count=schema_info.get('row_count')
             ))
         
-        return SchemaResponse(
+        response = SchemaResponse(
             success=True,
             schemas=[schema_name],
             tables=table_infos,
-            total_tables=len(tables)
+            total_tables=len(tables),
+            warnings=warnings or None
         )
         
+        # Per-table failures may be transient; only cache complete listings
+        if warnings:
+            return response
+        entry = schema_cache.put(cache_key, response.model_dump_json().encode())
+        return _cached_json_response(http_request, entry)
+        
     except Exception as e:
         logger.error(f"Error getting schema: {e}")
         return SchemaResponse(
@@ -188,20 +414,115 @@ async def get_schema(schema_name: str = "public"):
 
 
 @router.get("/api/trained-tables")
-async def get_trained_tables():
+async def get_trained_tables(http_request: Request):
     """Get list of tables that Vanna has been trained on"""
-    return {
-        "success": True,
-        "trained_tables": list(vanna_service.trained_tables),
-        "count": len(vanna_service.trained_tables)
-    }
+    entry = schema_cache.get(("trained_tables",))
+    if entry is None:
+        # Sorted so the ETag is stable for the same set of tables
+        trained_tables = sorted(vanna_service.trained_tables)
+        entry = schema_cache.put(("trained_tables",), orjson.dumps({
+            "success": True,
+            "trained_tables": trained_tables,
+            "count": len(trained_tables)
+        }))
+    return _cached_json_response(http_request, entry)
 
 
-@router.post("/api/query")
-async def execute_query(request: SQLGenerationRequest):
+@router.post("/api/query", response_model=SQLGenerationResponse)
+async def execute_query(request: SQLGenerationRequest, http_request: Request):
     """
     Convenience endpoint that always executes the query
     Alias for /api/generate-sql with execute=True
+    
+    Declaring response_model lets FastAPI serialize row-heavy results
+    straight to JSON bytes in pydantic-core instead of jsonable_encoder +
+    json.dumps.
+    
+    Send "Accept: application/vnd.apache.arrow.stream" (requires pyarrow)
+    to receive a single-statement read result as an Arrow IPC stream;
+    other results are still returned as JSON.
+    """
+    request.execute = True
+    if ARROW_STREAM_MEDIA_TYPE not in http_request.headers.get("accept", ""):
+        return await generate_sql(request)
+    
+    if pa is None:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail="Arrow responses require pyarrow to be installed"
+        )
+    
+    # Columnar rows map directly onto Arrow arrays
+    request.result_format = "columnar"
+    try:
+        result = await _run_generation(request)
+        
+        if result['success'] and result.get('operation') == 'read':
+            return _arrow_response(result)
+        return _generation_response(request, result)
+        
+    except Exception as e:
+        logger.error(f"Error in execute_query endpoint: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
+@router.post("/api/query/stream")
+async def stream_query(request: SQLGenerationRequest):
     """
+    Generate and execute a single SELECT, streaming rows as NDJSON
+    
+    Rows are read through a server-side cursor and written as they arrive
+    (one JSON object per line), so neither the service nor the client holds
+    the full result set. max_rows defaults to MAX_STREAM_RESULTS. Generation
+    failures and non-SELECT SQL get a regular SQLGenerationResponse; an error
+    after streaming has started is reported as a final {"error": ...} line.
+    """
+    if not vanna_service.initialized:
+        return SQLGenerationResponse(success=False, error="Vanna Agent not initialized")
+    
+    # The SQL runs without the caller reviewing it, so no semantic matches
     request.execute = True
-    return await generate_sql(request)
+    result = await _generate_cached(request)
+    if not result['success']:
+        return SQLGenerationResponse(
+            success=False,
+            error=result.get('error'),
+            sql=result.get('sql'),
+            metadata=result.get('metadata', {})
+        )
+    
+    sql = result['sql']
+    if not vanna_service.is_single_select(sql):
+        return SQLGenerationResponse(
+            success=False,
+            error="Streaming supports a single SELECT statement; use /api/query instead",
+            sql=sql,
+            metadata=result.get('metadata', {})
+        )
+    
+    max_rows = request.max_rows or settings.MAX_STREAM_RESULTS
+    bound_sql, args = vanna_service.bind_user_id(sql, request.user_id)
+    
+    async def ndjson_rows():
+        try:
+            async with db_manager.stream_query(bound_sql, max_rows, args) as (columns, rows):
+                chunk = []
+                async for row in rows:
+                    chunk.append(orjson.dumps(
+                        dict(zip(columns, row)),
+                        default=to_jsonable_python,
+                        option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+                    ))
+                    if len(chunk) >= _STREAM_CHUNK_ROWS:
+                        yield b"".join(chunk)
+                        chunk.clear()
+                if chunk:
+                    yield b"".join(chunk)
+        except Exception as e:
+            logger.error(f"Error streaming query results: {e}")
+            yield orjson.dumps({"error": str(e)}, option=orjson.OPT_APPEND_NEWLINE)
+    
+    return StreamingResponse(ndjson_rows(), media_type="application/x-ndjson")
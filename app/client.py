@@ -5,12 +5,67 @@ Simple Python client for interacting with the Vanna SQL Service API.
 Provides easy-to-use methods for SQL generation and execution.
 """
 
+import asyncio
+import threading
 import httpx
 from typing import Optional, Dict, Any, List
 from dataclasses import dataclass
 import json
 
 
+# Keep-alive pool shared by every request a client instance makes
+_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=50)
+
+# Process-wide clients used by instances created with shared=True, so
+# short-lived client objects reuse one connection pool
+_shared_client: Optional[httpx.Client] = None
+_shared_client_lock = threading.Lock()
+_shared_async_client: Optional[httpx.AsyncClient] = None
+_shared_async_lock = asyncio.Lock()
+
+
+def _get_shared_client() -> httpx.Client:
+    """Return the process-wide sync client, creating it on first use"""
+    global _shared_client
+    if _shared_client is None:
+        with _shared_client_lock:
+            if _shared_client is None:
+                _shared_client = httpx.Client(
+                    transport=httpx.HTTPTransport(http2=True, limits=_HTTP_LIMITS, retries=1)
+                )
+    return _shared_client
+
+
+async def _get_shared_async_client() -> httpx.AsyncClient:
+    """Return the process-wide async client, creating it on first use"""
+    global _shared_async_client
+    if _shared_async_client is None:
+        async with _shared_async_lock:
+            if _shared_async_client is None:
+                _shared_async_client = httpx.AsyncClient(
+                    transport=httpx.AsyncHTTPTransport(http2=True, limits=_HTTP_LIMITS, retries=1)
+                )
+    return _shared_async_client
+
+
+def close_shared_clients():
+    """Close the shared sync client (e.g. at interpreter shutdown)"""
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is not None:
+            _shared_client.close()
+            _shared_client = None
+
+
+async def aclose_shared_clients():
+    """Close the shared async client (e.g. in an application's shutdown hook)"""
+    global _shared_async_client
+    async with _shared_async_lock:
+        if _shared_async_client is not None:
+            await _shared_async_client.aclose()
+            _shared_async_client = None
+
+
 @dataclass
 class SQLResult:
     """Result of SQL generation or execution"""
@@ -28,7 +83,8 @@ class VannaSQLClient:
     def __init__(
         self, 
         base_url: str = "http://localhost:8010",
-        timeout: float = 30.0
+        timeout: float = 30.0,
+        shared: bool = False
     ):
         """
         Initialize Vanna SQL Client
@@ -36,10 +92,18 @@ class VannaSQLClient:
         Args:
             base_url: Base URL of Vanna SQL Service
             timeout: Request timeout in seconds
+            shared: Use the process-wide connection pool instead of a
+                private one (cheap for ad-hoc, short-lived instances)
         """
         self.base_url = base_url.rstrip('/')
         self.timeout = timeout
-        self.client = httpx.Client(timeout=timeout)
+        self.shared = shared
+        # HTTP/2 multiplexes requests over one kept-alive connection, so
+        # repeated calls skip the TCP/TLS handshake
+        self.client = _get_shared_client() if shared else httpx.Client(
+            timeout=timeout,
+            transport=httpx.HTTPTransport(http2=True, limits=_HTTP_LIMITS, retries=1)
+        )
     
     def __enter__(self):
         return self
@@ -48,8 +112,14 @@ class VannaSQLClient:
         self.close()
     
     def close(self):
-        """Close the HTTP client"""
-        self.client.close()
+        """Close the HTTP client (the shared pool stays open)"""
+        if not self.shared:
+            self.client.close()
+    
+    def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Send a request to the service through the pooled client"""
+        kwargs.setdefault("timeout", self.timeout)
+        return self.client.request(method, f"{self.base_url}{path}", **kwargs)
     
     def health_check(self) -> Dict[str, Any]:
         """
@@ -58,7 +128,7 @@ class VannaSQLClient:
         Returns:
             Health status information
         """
-        response = self.client.get(f"{self.base_url}/health")
+        response = self._request("GET", "/health")
         response.raise_for_status()
         return response.json()
     
@@ -81,8 +151,8 @@ class VannaSQLClient:
         if schema:
             payload["schema"] = schema
         
-        response = self.client.post(
-            f"{self.base_url}/api/generate-sql",
+        response = self._request(
+            "POST", "/api/generate-sql",
             json=payload
         )
         
@@ -124,8 +194,8 @@ class VannaSQLClient:
         if schema:
             payload["schema"] = schema
         
-        response = self.client.post(
-            f"{self.base_url}/api/query",
+        response = self._request(
+            "POST", "/api/query",
             json=payload
         )
         
@@ -149,7 +219,8 @@ class VannaSQLClient:
     def train_schema(
         self,
         schema: str = "public",
-        tables: Optional[List[str]] = None
+        tables: Optional[List[str]] = None,
+        background: bool = False
     ) -> Dict[str, Any]:
         """
         Train Vanna on database schema
@@ -157,21 +228,38 @@ class VannaSQLClient:
         Args:
             schema: Schema name (default: public)
             tables: Optional list of specific tables to train on
+            background: Start a background job; poll it with get_training_job
         
         Returns:
-            Training results
+            Training results (job_id only, when background)
         """
         payload = {"schema": schema}
         if tables:
             payload["tables"] = tables
+        if background:
+            payload["background"] = True
         
-        response = self.client.post(
-            f"{self.base_url}/api/train-schema",
+        response = self._request(
+            "POST", "/api/train-schema",
             json=payload
         )
         response.raise_for_status()
         return response.json()
     
+    def get_training_job(self, job_id: str) -> Dict[str, Any]:
+        """
+        Get progress of a background training job
+        
+        Args:
+            job_id: Id returned by train_schema(background=True)
+        
+        Returns:
+            Job status, tables trained so far and ETA
+        """
+        response = self._request("GET", f"/api/train-schema/{job_id}")
+        response.raise_for_status()
+        return response.json()
+    
     def get_schema(
         self,
         schema: str = "public"
@@ -185,8 +273,8 @@ class VannaSQLClient:
         Returns:
             Schema information
         """
-        response = self.client.get(
-            f"{self.base_url}/api/schema",
+        response = self._request(
+            "GET", "/api/schema",
             params={"schema": schema}
         )
         response.raise_for_status()
@@ -199,7 +287,7 @@ class VannaSQLClient:
         Returns:
             List of trained table names
         """
-        response = self.client.get(f"{self.base_url}/api/trained-tables")
+        response = self._request("GET", "/api/trained-tables")
         response.raise_for_status()
         data = response.json()
         return data["trained_tables"]
@@ -212,7 +300,8 @@ class AsyncVannaSQLClient:
     def __init__(
         self, 
         base_url: str = "http://localhost:8010",
-        timeout: float = 30.0
+        timeout: float = 30.0,
+        shared: bool = False
     ):
         """
         Initialize Async Vanna SQL Client
@@ -220,10 +309,17 @@ class AsyncVannaSQLClient:
         Args:
             base_url: Base URL of Vanna SQL Service
             timeout: Request timeout in seconds
+            shared: Use the process-wide connection pool instead of a
+                private one. It is created lazily on first request and is
+                bound to that event loop.
         """
         self.base_url = base_url.rstrip('/')
         self.timeout = timeout
-        self.client = httpx.AsyncClient(timeout=timeout)
+        self.shared = shared
+        self.client: Optional[httpx.AsyncClient] = None if shared else httpx.AsyncClient(
+            timeout=timeout,
+            transport=httpx.AsyncHTTPTransport(http2=True, limits=_HTTP_LIMITS, retries=1)
+        )
     
     async def __aenter__(self):
         return self
@@ -232,12 +328,25 @@ class AsyncVannaSQLClient:
         await self.close()
     
     async def close(self):
-        """Close the HTTP client"""
-        await self.client.aclose()
+        """Close the HTTP client (the shared pool stays open)"""
+        if not self.shared:
+            await self.client.aclose()
+    
+    async def _ensure_client(self) -> httpx.AsyncClient:
+        """Return the HTTP client, attaching the shared pool on first use"""
+        if self.client is None:
+            self.client = await _get_shared_async_client()
+        return self.client
+    
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Send a request to the service through the pooled client"""
+        client = await self._ensure_client()
+        kwargs.setdefault("timeout", self.timeout)
+        return await client.request(method, f"{self.base_url}{path}", **kwargs)
     
     async def health_check(self) -> Dict[str, Any]:
         """Check service health"""
-        response = await self.client.get(f"{self.base_url}/health")
+        response = await self._request("GET", "/health")
         response.raise_for_status()
         return response.json()
     
@@ -251,8 +360,8 @@ class AsyncVannaSQLClient:
         if schema:
             payload["schema"] = schema
         
-        response = await self.client.post(
-            f"{self.base_url}/api/generate-sql",
+        response = await self._request(
+            "POST", "/api/generate-sql",
             json=payload
         )
         
@@ -284,8 +393,8 @@ class AsyncVannaSQLClient:
         if schema:
             payload["schema"] = schema
         
-        response = await self.client.post(
-            f"{self.base_url}/api/query",
+        response = await self._request(
+            "POST", "/api/query",
             json=payload
         )
         
@@ -306,30 +415,79 @@ class AsyncVannaSQLClient:
                 error=error_data.get("detail", "Unknown error")
             )
     
+    async def batch_query(
+        self,
+        questions: List[str],
+        schema: Optional[str] = None,
+        execute: bool = True,
+        concurrency: int = 8
+    ) -> List[SQLResult]:
+        """
+        Run several independent questions concurrently
+        
+        The service-side LLM call dominates latency, so wall time drops from
+        the sum of latencies to roughly max(latency) * ceil(N / concurrency).
+        Tune `concurrency` to the service's OpenAI rate limits.
+        
+        Args:
+            questions: Natural language questions
+            schema: Optional schema name to query
+            execute: Whether to execute the queries
+            concurrency: Maximum number of in-flight requests
+        
+        Returns:
+            One SQLResult per question, in input order. Transport errors are
+            returned as unsuccessful results rather than raised.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def run_one(question: str) -> SQLResult:
+            async with semaphore:
+                return await self.query(question, schema, execute)
+        
+        outcomes = await asyncio.gather(
+            *(run_one(question) for question in questions),
+            return_exceptions=True
+        )
+        return [
+            SQLResult(sql="", success=False, error=str(outcome))
+            if isinstance(outcome, Exception) else outcome
+            for outcome in outcomes
+        ]
+    
     async def train_schema(
         self,
         schema: str = "public",
-        tables: Optional[List[str]] = None
+        tables: Optional[List[str]] = None,
+        background: bool = False
     ) -> Dict[str, Any]:
         """Train Vanna on database schema"""
         payload = {"schema": schema}
         if tables:
             payload["tables"] = tables
+        if background:
+            payload["background"] = True
         
-        response = await self.client.post(
-            f"{self.base_url}/api/train-schema",
+        response = await self._request(
+            "POST", "/api/train-schema",
             json=payload
         )
         response.raise_for_status()
         return response.json()
     
+    async def get_training_job(self, job_id: str) -> Dict[str, Any]:
+        """Get progress of a background training job"""
+        response = await self._request("GET", f"/api/train-schema/{job_id}")
+        response.raise_for_status()
+        return response.json()
+    
     async def get_schema(
         self,
         schema: str = "public"
     ) -> Dict[str, Any]:
         """Get database schema information"""
-        response = await self.client.get(
-            f"{self.base_url}/api/schema",
+        response = await self._request(
+            "GET", "/api/schema",
             params={"schema": schema}
         )
         response.raise_for_status()
@@ -337,7 +495,7 @@ class AsyncVannaSQLClient:
     
     async def get_trained_tables(self) -> List[str]:
         """Get list of trained tables"""
-        response = await self.client.get(f"{self.base_url}/api/trained-tables")
+        response = await self._request("GET", "/api/trained-tables")
         response.raise_for_status()
         data = response.json()
         return data["trained_tables"]
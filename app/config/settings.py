@@ -1,8 +1,10 @@
 """
 Configuration settings for Vanna SQL Service
 """
-from pydantic_settings import BaseSettings
-from typing import Optional
+from pydantic import field_validator
+from pydantic_settings import BaseSettings, NoDecode
+from typing import Optional, FrozenSet, Any, Annotated
+import json
 import os
 
 
@@ -14,17 +16,43 @@ class Settings(BaseSettings):
     SERVICE_VERSION: str = "2.0.0"
     HOST: str = "0.0.0.0"
     PORT: int = 8010
+    # Each worker holds its own DB pool, SQL caches and training state, so
+    # scale out with care: pool connections =
+    # WORKERS * (DB_MAX_POOL_SIZE + SQL_RUNNER_MAX_POOL_SIZE)
+    WORKERS: int = 1
+    DEBUG: bool = False  # Development mode: auto-reload on code changes (python -m app.main)
     
     # Database Configuration
     DATABASE_URL: str
     DB_MIN_POOL_SIZE: int = 2
     DB_MAX_POOL_SIZE: int = 10
     DB_TIMEOUT: int = 30
+    DB_STATEMENT_CACHE_SIZE: int = 512  # Prepared statements cached per connection (0 disables)
+    DB_MAX_CACHED_STATEMENT_LIFETIME: int = 300  # Seconds a cached statement may live
+    DB_MAX_INACTIVE_CONNECTION_LIFETIME: float = 300.0  # Idle connections above min size are closed after this
+    DB_JIT: bool = False  # Postgres JIT mostly adds planning latency to short OLTP queries
+    # Separate pool used by the Vanna agent's RunSqlTool and user resolution
+    SQL_RUNNER_MIN_POOL_SIZE: int = 2
+    SQL_RUNNER_MAX_POOL_SIZE: int = 10
+    SCHEMA_CACHE_TTL: int = 3600  # Seconds to cache table/column introspection
+    ROW_COUNT_CACHE_TTL: int = 60  # Seconds to cache per-table row counts
+    SCHEMA_MAX_TABLES: int = 20  # Tables described by /api/schema (0 = no limit)
+    SCHEMA_RESPONSE_CACHE_TTL: int = 60  # Seconds /api/schema and /api/trained-tables responses are reused
     
     # OpenAI Configuration (for Vanna LLM)
     OPENAI_API_KEY: str
     OPENAI_MODEL: str = "gpt-5"
     LLM_TEMPERATURE: float = 0.1
+    GENERATION_MAX_CONCURRENCY: int = 16  # Distinct generate-only LLM calls in flight
+    
+    # Generated SQL cache (SQL + explanation only, never result rows)
+    SQL_CACHE_ENABLED: bool = True
+    SQL_CACHE_MAX_SIZE: int = 2048
+    SQL_CACHE_TTL: int = 3600  # Seconds
+    SEMANTIC_CACHE_ENABLED: bool = False  # Reuse SQL of reworded questions (generate-only requests)
+    SEMANTIC_CACHE_CAPACITY: int = 1024
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92  # Minimum cosine similarity for a hit
+    SEMANTIC_EXEMPLAR_THRESHOLD: float = 0.75  # Below a hit but above this, earlier SQL is shown to the LLM as an example
     
     # Vector Database (Qdrant)
     QDRANT_URL: str = "http://hrms-qdrant:6333"  # Qdrant server URL
@@ -38,16 +66,30 @@ class Settings(BaseSettings):
     # Schema Training Configuration
     SCHEMA_NAME: str = "hrms"  # Default schema config to load (e.g., 'hrms', 'assets')
     AUTO_TRAIN_ON_STARTUP: bool = True  # Whether to train Vanna on startup
+    TRAINING_BATCH_SIZE: int = 64  # Memories written per Qdrant upsert during training
     
     # Security
+    USER_CACHE_TTL: int = 300  # Seconds a resolved employee/role lookup is reused
+    USER_CACHE_MAX_SIZE: int = 1024
     CORS_ORIGINS: str = "*"
     MAX_QUERY_RESULTS: int = 1000
+    MAX_STREAM_RESULTS: int = 100000  # Row cap for /api/query/stream
     QUERY_TIMEOUT: int = 30
-    ALLOWED_OPERATIONS: list = ["SELECT", "INSERT", "UPDATE", "DELETE"]
+    MAX_CONCURRENT_STATEMENTS: int = 4  # Read-only statements of one request run concurrently up to this
+    # frozenset for O(1) membership checks; env value is a CSV string
+    ALLOWED_OPERATIONS: Annotated[FrozenSet[str], NoDecode] = frozenset({"SELECT", "INSERT", "UPDATE", "DELETE"})
     
     # Logging
     LOG_LEVEL: str = "INFO"
     
+    @field_validator("ALLOWED_OPERATIONS", mode="before")
+    @classmethod
+    def _parse_allowed_operations(cls, value: Any) -> Any:
+        """Accept CSV ("SELECT,INSERT") or JSON list env values as well as iterables"""
+        if isinstance(value, str):
+            value = json.loads(value) if value.lstrip().startswith("[") else value.split(",")
+        return frozenset(op.strip().upper() for op in value if op.strip())
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
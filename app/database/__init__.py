@@ -1,4 +1,5 @@
 """Database package"""
-from .manager import db_manager, DatabaseManager
+from .manager import db_manager, DatabaseManager, PreparedConnection, rows_to_records, with_write_keyword
 
-__all__ = ["db_manager", "DatabaseManager"]
+__all__ = ["db_manager", "DatabaseManager", "PreparedConnection", "rows_to_records",
+           "with_write_keyword"]
@@ -1,15 +1,272 @@
 """
 Database connection and query execution manager
 """
+import asyncio
 import asyncpg
+from asyncpg.prepared_stmt import PreparedStatement
+import itertools
 import logging
-from typing import List, Dict, Any, Optional
+import re
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable, AsyncIterator
 from contextlib import asynccontextmanager
 
 from ..config import settings
 
 logger = logging.getLogger(__name__)
 
+# Rows fetched per cursor round trip when streaming query results
+CURSOR_PREFETCH = 1000
+
+# A LIMIT clause (optionally with OFFSET) that ends the statement
+_TRAILING_LIMIT_RE = re.compile(
+    r'\blimit\s+(?:\d+|all)(?:\s+offset\s+\d+(?:\s+rows?)?)?\s*$',
+    re.IGNORECASE
+)
+
+# RETURNING sits at the end of a write, so only the tail is scanned
+_RETURNING_RE = re.compile(r'\breturning\b', re.IGNORECASE)
+_RETURNING_TAIL = 512
+
+# Statements that produce a row set and can be wrapped in a subquery
+_READ_QUERY_RE = re.compile(
+    r'\s*(?:--[^\n]*\n\s*|/\*(?:[^*]|\*(?!/))*\*/\s*)*(?:select|with)\b',
+    re.IGNORECASE
+)
+
+# Words and parentheses of a statement; strings, quoted identifiers,
+# comments and dollar-quoted bodies are matched (and skipped) whole
+_SQL_TOKEN_RE = re.compile(
+    r"""
+    (?<![A-Za-z0-9_$])[Ee]'(?:[^'\\]|\\.|'')*(?:'|\Z)
+    | '(?:[^']|'')*(?:'|\Z)
+    | "(?:[^"]|"")*(?:"|\Z)
+    | --[^\n]*
+    | /\*.*?(?:\*/|\Z)
+    | \$(?P<tag>[A-Za-z_][A-Za-z0-9_]*|)\$.*?(?:\$(?P=tag)\$|\Z)
+    | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    | (?P<paren>[()])
+    """,
+    re.VERBOSE | re.DOTALL
+)
+_DATA_MODIFYING_KEYWORDS = frozenset({'INSERT', 'UPDATE', 'DELETE', 'MERGE'})
+
+# Introspection queries, prepared once per pooled connection
+_SQL_COLUMNS = """
+    SELECT 
+        column_name,
+        data_type,
+        is_nullable,
+        column_default,
+        character_maximum_length
+    FROM information_schema.columns
+    WHERE table_schema = $1 AND table_name = $2
+    ORDER BY ordinal_position
+"""
+
+# Columns plus planner row estimate for many tables in one round trip
+_SQL_SCHEMA_BULK = """
+    SELECT 
+        c.table_name,
+        c.column_name,
+        c.data_type,
+        c.is_nullable,
+        c.column_default,
+        c.character_maximum_length,
+        GREATEST(pg.reltuples, 0)::bigint AS row_count
+    FROM information_schema.columns c
+    LEFT JOIN pg_namespace n ON n.nspname = c.table_schema
+    LEFT JOIN pg_class pg ON pg.relnamespace = n.oid AND pg.relname = c.table_name
+    WHERE c.table_schema = $1 AND c.table_name = ANY($2::text[])
+    ORDER BY c.table_name, c.ordinal_position
+"""
+
+_SQL_ROWCOUNT_EST = """
+    SELECT GREATEST(c.reltuples, 0)::bigint
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = $1 AND c.relname = $2
+"""
+
+_SQL_ROWCOUNT_EST_BULK = """
+    SELECT c.relname, GREATEST(c.reltuples, 0)::bigint AS row_count
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = $1 AND c.relname = ANY($2::text[])
+"""
+
+_SQL_TABLES = """
+    SELECT table_name 
+    FROM information_schema.tables
+    WHERE table_schema = $1 
+    AND table_type = 'BASE TABLE'
+    ORDER BY table_name
+"""
+
+# CREATE TABLE text built server-side; %I quotes identifiers when needed.
+# HAVING drops the single all-NULL aggregate row for unknown tables.
+_SQL_TABLE_DDL = """
+    SELECT format(
+        E'CREATE TABLE %I (\\n%s\\n);',
+        $2::text,
+        string_agg(
+            format(
+                '    %I %s%s%s%s',
+                column_name,
+                data_type,
+                CASE WHEN character_maximum_length IS NOT NULL
+                     THEN '(' || character_maximum_length || ')' ELSE '' END,
+                CASE WHEN is_nullable = 'NO' THEN ' NOT NULL' ELSE '' END,
+                CASE WHEN column_default IS NOT NULL
+                     THEN ' DEFAULT ' || column_default ELSE '' END
+            ),
+            E',\\n' ORDER BY ordinal_position
+        )
+    )
+    FROM information_schema.columns
+    WHERE table_schema = $1 AND table_name = $2
+    HAVING count(*) > 0
+"""
+
+# Same CREATE TABLE text for many tables in one round trip; tables without
+# columns produce no row
+_SQL_TABLE_DDL_BULK = """
+    SELECT
+        table_name::text AS table_name,
+        format(
+            E'CREATE TABLE %I (\\n%s\\n);',
+            table_name::text,
+            string_agg(
+                format(
+                    '    %I %s%s%s%s',
+                    column_name,
+                    data_type,
+                    CASE WHEN character_maximum_length IS NOT NULL
+                         THEN '(' || character_maximum_length || ')' ELSE '' END,
+                    CASE WHEN is_nullable = 'NO' THEN ' NOT NULL' ELSE '' END,
+                    CASE WHEN column_default IS NOT NULL
+                         THEN ' DEFAULT ' || column_default ELSE '' END
+                ),
+                E',\\n' ORDER BY ordinal_position
+            )
+        ) AS ddl
+    FROM information_schema.columns
+    WHERE table_schema = $1 AND table_name = ANY($2::text[])
+    GROUP BY table_name
+"""
+
+_PREPARED_SQL = {
+    "columns": _SQL_COLUMNS,
+    "schema_bulk": _SQL_SCHEMA_BULK,
+    "rowcount": _SQL_ROWCOUNT_EST,
+    "rowcount_bulk": _SQL_ROWCOUNT_EST_BULK,
+    "tables": _SQL_TABLES,
+    "ddl": _SQL_TABLE_DDL,
+    "ddl_bulk": _SQL_TABLE_DDL_BULK,
+}
+
+# Sentinel for schema cache misses (cached values may legitimately be falsy)
+_MISSING = object()
+
+
+def _statement_result(idx: int, sql: str, error: Optional[str] = None) -> Dict[str, Any]:
+    """Result entry for one statement of a batch, before (or without) rows"""
+    return {
+        "query_index": idx,
+        "sql": sql,
+        "success": False,
+        "columns": [],
+        "rows": [],
+        "row_count": 0,
+        "error": error
+    }
+
+
+def _rows_to_columnar(rows: List[asyncpg.Record], columns: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Convert fetched records to {"columns", "rows"} with one keys list per result"""
+    if columns is None:
+        columns = list(rows[0].keys()) if rows else []
+    return {"columns": columns, "rows": [tuple(row) for row in rows]}
+
+
+def with_write_keyword(sql: str) -> str:
+    """
+    Data-modifying keyword run by a WITH statement, or '' if there is none.
+    
+    Finds INSERT/UPDATE/DELETE/MERGE opening a CTE body ("AS (DELETE ...")
+    or the main statement after the CTE list (") INSERT ..."), i.e. right
+    after a parenthesis; this skips FOR UPDATE and ON CONFLICT DO UPDATE.
+    Statements not starting with WITH return '' after the first word.
+    """
+    previous = None
+    for match in _SQL_TOKEN_RE.finditer(sql):
+        word = match.group('word')
+        if word:
+            word = word.upper()
+            if previous is None and word != 'WITH':
+                return ''
+            if previous in ('(', ')') and word in _DATA_MODIFYING_KEYWORDS:
+                return word
+            previous = word
+        elif match.group('paren'):
+            previous = match.group('paren')
+    return ''
+
+
+def rows_to_records(columns: List[str], rows: List[tuple]) -> List[Dict[str, Any]]:
+    """Convert a columnar result set into a list of row dicts"""
+    return [dict(zip(columns, row)) for row in rows]
+
+
+class PreparedConnection(asyncpg.Connection):
+    """asyncpg connection carrying its prepared introspection statements"""
+    
+    __slots__ = ("prepared", "_statements")
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Query text -> statement from prepare(), least recently used first
+        self._statements: "OrderedDict[str, PreparedStatement]" = OrderedDict()
+    
+    async def prepare_cached(self, query: str) -> PreparedStatement:
+        """
+        Like prepare(), but reusing this connection's statement for the same
+        query text.
+        
+        prepare() always sends a fresh Parse, so repeated query text (cached
+        generated SQL, dashboards) would be re-planned every time. Up to
+        DB_STATEMENT_CACHE_SIZE statements are kept; asyncpg closes evicted
+        ones on the server once they are no longer referenced.
+        """
+        statement = self._statements.get(query)
+        if statement is not None:
+            self._statements.move_to_end(query)
+            return statement
+        
+        statement = await self.prepare(query)
+        if settings.DB_STATEMENT_CACHE_SIZE > 0:
+            self._statements[query] = statement
+            while len(self._statements) > settings.DB_STATEMENT_CACHE_SIZE:
+                self._statements.popitem(last=False)
+        return statement
+    
+    def discard_prepared(self, query: str):
+        """Forget the statement for query, e.g. after it failed (stale schema)"""
+        self._statements.pop(query, None)
+
+
+async def _prepare_statements(conn: PreparedConnection):
+    """
+    Pool init callback: prepare introspection queries on a new connection.
+    
+    Runs once per physical connection, so later calls skip parse/plan no
+    matter which connection the pool hands out.
+    """
+    conn.prepared = {
+        name: await conn.prepare(sql) for name, sql in _PREPARED_SQL.items()
+    }
+
 
 class DatabaseManager:
     """Manages PostgreSQL database connections and operations"""
@@ -17,18 +274,55 @@ class DatabaseManager:
     def __init__(self):
         self.pool: Optional[asyncpg.Pool] = None
         self.database_url = settings.DATABASE_URL
+        # Schema introspection cache: key -> (expires_at, value)
+        self._schema_cache: Dict[Tuple[str, ...], Tuple[float, Any]] = {}
+        self._schema_cache_locks: Dict[Tuple[str, ...], asyncio.Lock] = {}
+        self._init_lock = asyncio.Lock()
     
     async def initialize(self):
-        """Initialize database connection pool"""
+        """Initialize database connection pool (idempotent, safe to call concurrently)"""
+        async with self._init_lock:
+            if self.pool is not None:
+                return
+            await self._create_pool()
+    
+    async def _create_pool(self):
+        """
+        Create the asyncpg pool.
+        
+        create_pool connects min_size connections before returning and the
+        init callback prepares introspection statements on each, so the pool
+        is warm when startup completes. Session settings travel in the
+        connection startup packet rather than as per-request SETs.
+        
+        Each connection also keeps an LRU of prepared statements, so repeated
+        query text (introspection, cached generated SQL) skips parse/plan.
+        """
         try:
             self.pool = await asyncpg.create_pool(
                 self.database_url,
                 min_size=settings.DB_MIN_POOL_SIZE,
                 max_size=settings.DB_MAX_POOL_SIZE,
                 timeout=settings.DB_TIMEOUT,
-                command_timeout=settings.QUERY_TIMEOUT
+                command_timeout=settings.QUERY_TIMEOUT,
+                statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+                max_cached_statement_lifetime=settings.DB_MAX_CACHED_STATEMENT_LIFETIME,
+                max_inactive_connection_lifetime=settings.DB_MAX_INACTIVE_CONNECTION_LIFETIME,
+                connection_class=PreparedConnection,
+                init=_prepare_statements,
+                server_settings={
+                    "application_name": settings.SERVICE_NAME,
+                    "jit": "on" if settings.DB_JIT else "off",
+                    # Server-side cap matching the client-side command_timeout
+                    "statement_timeout": str(settings.QUERY_TIMEOUT * 1000)
+                }
+            )
+            self.invalidate_schema_cache()
+            logger.info(
+                f"✅ Database connection pool created ({self.pool.get_size()} connections warm, "
+                f"min={self.pool.get_min_size()}, max={self.pool.get_max_size()}, "
+                f"statement_cache={settings.DB_STATEMENT_CACHE_SIZE})"
             )
-            logger.info("✅ Database connection pool created")
         except Exception as e:
             logger.error(f"❌ Failed to create database pool: {e}")
             raise
@@ -37,10 +331,13 @@ class DatabaseManager:
         """Close database connection pool"""
         if self.pool:
             await self.pool.close()
+            self.pool = None
             logger.info("Database connection pool closed")
     
     async def is_healthy(self) -> bool:
         """Check if database connection is healthy"""
+        if self.pool is None:
+            return False
         try:
             async with self.pool.acquire() as conn:
                 await conn.fetchval("SELECT 1")
@@ -52,32 +349,78 @@ class DatabaseManager:
     async def execute_query(
         self, 
         sql: str, 
-        max_rows: Optional[int] = None
-    ) -> List[Dict[str, Any]]:
-        """Execute SQL query and return results"""
+        max_rows: Optional[int] = None,
+        args: Tuple[Any, ...] = ()
+    ) -> Dict[str, Any]:
+        """
+        Execute SQL query and return results in columnar form.
+        
+        Rows are read through a server-side cursor and collection stops once
+        max_rows is reached, so the limit is enforced without rewriting the
+        SQL and only one copy of the result set is held in memory. args bind
+        the query's $n parameters.
+        
+        Returns:
+            {"columns": [name, ...], "rows": [(value, ...), ...]}
+            (see rows_to_records for the list-of-dicts form)
+        """
         try:
-            async with self.pool.acquire() as conn:
-                # Apply row limit if specified
-                if max_rows:
-                    sql = self._add_limit_clause(sql, max_rows)
-                
-                # Execute query
-                rows = await conn.fetch(sql)
-                
-                # Convert to list of dicts
-                results = [dict(row) for row in rows]
-                
-                logger.info(f"Query executed successfully. Rows returned: {len(results)}")
-                return results
+            async with self.stream_query(sql, max_rows, args) as (columns, row_iter):
+                rows = [row async for row in row_iter]
+            
+            logger.info(f"Query executed successfully. Rows returned: {len(rows)}")
+            return {"columns": columns, "rows": rows}
                 
         except Exception as e:
             logger.error(f"Query execution failed: {e}")
             raise
     
+    @asynccontextmanager
+    async def stream_query(
+        self,
+        sql: str,
+        max_rows: Optional[int] = None,
+        args: Tuple[Any, ...] = ()
+    ) -> AsyncIterator[Tuple[List[str], AsyncIterator[tuple]]]:
+        """
+        Open a server-side cursor for incremental reads.
+        
+        Yields (columns, rows) where rows is an async iterator of tuples that
+        stops after max_rows. At most CURSOR_PREFETCH rows are buffered; the
+        pool connection and transaction are held until the context exits.
+        args bind the query's $n parameters.
+        """
+        prefetch = min(max_rows, CURSOR_PREFETCH) if max_rows else CURSOR_PREFETCH
+        
+        async with self.pool.acquire() as conn:
+            try:
+                # Server-side cursors only live inside a transaction
+                async with conn.transaction():
+                    stmt = await conn.prepare_cached(sql)
+                    # Column names come from the statement, so empty results keep them too
+                    columns = [attr.name for attr in stmt.get_attributes()]
+                    
+                    async def rows() -> AsyncIterator[tuple]:
+                        count = 0
+                        async for row in stmt.cursor(*args, prefetch=prefetch):
+                            yield tuple(row)
+                            count += 1
+                            if max_rows and count >= max_rows:
+                                return
+                    
+                    yield columns, rows()
+            except Exception:
+                # The statement may be stale; prepare it afresh next time
+                conn.discard_prepared(sql)
+                raise
+    
     async def execute_multiple_queries(
         self,
         sql_statements: List[str],
-        max_rows: Optional[int] = None
+        max_rows: Optional[int] = None,
+        parallel: bool = False,
+        atomic: bool = False,
+        args: Optional[List[Tuple[Any, ...]]] = None
     ) -> List[Dict[str, Any]]:
         """
         Execute multiple SQL statements and return results for each.
@@ -85,60 +428,143 @@ class DatabaseManager:
         Args:
             sql_statements: List of SQL statements to execute
             max_rows: Maximum rows per query result
+            parallel: Run statements concurrently on separate pool
+                connections. Only safe for independent read-only statements;
+                wall time drops from the sum of latencies to the slowest one.
+            atomic: Run the statements in order in one transaction that is
+                rolled back if any of them fails (see _execute_atomic)
+            args: Parameters for each statement, aligned with sql_statements
             
         Returns:
-            List of result objects, one per query
+            List of result objects, one per query, in statement order. Rows
+            are columnar: "columns" holds the names and "rows" one tuple per row.
         """
-        results = []
+        statements = [
+            (idx, sql.strip()) for idx, sql in enumerate(sql_statements) if sql.strip()
+        ]
+        args = args or [()] * len(sql_statements)
+        
+        if atomic:
+            return await self._execute_atomic(statements, max_rows, args)
+        
+        if not parallel:
+            async with self.pool.acquire() as conn:
+                return [
+                    await self._run_statement(conn, idx, sql, max_rows, args[idx])
+                    for idx, sql in statements
+                ]
+        
+        # Cap one request's fan-out and leave pool headroom so health checks
+        # and other requests are not starved
+        semaphore = asyncio.Semaphore(max(1, min(
+            len(statements),
+            settings.MAX_CONCURRENT_STATEMENTS,
+            settings.DB_MAX_POOL_SIZE - 2
+        )))
+        
+        async def run(idx: int, sql: str) -> Dict[str, Any]:
+            async with semaphore:
+                async with self.pool.acquire() as conn:
+                    return await self._run_statement(conn, idx, sql, max_rows, args[idx])
+        
+        # gather preserves argument order
+        return list(await asyncio.gather(*(run(idx, sql) for idx, sql in statements)))
+    
+    async def _execute_atomic(
+        self,
+        statements: List[Tuple[int, str]],
+        max_rows: Optional[int],
+        args: List[Tuple[Any, ...]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Run statements in order in one transaction, all-or-nothing.
         
+        Each statement is sent as its own extended-protocol message, which
+        carries exactly one statement. Execution stops at the first failure
+        and the transaction is rolled back: earlier statements are reported
+        as rolled back and later ones as not run.
+        """
+        results = []
         async with self.pool.acquire() as conn:
-            for idx, sql in enumerate(sql_statements):
-                sql = sql.strip()
-                if not sql:
-                    continue
-                    
-                query_result = {
-                    "query_index": idx,
-                    "sql": sql,
-                    "success": False,
-                    "rows": [],
-                    "row_count": 0,
-                    "error": None
-                }
-                
-                try:
-                    # Apply row limit if specified
-                    if max_rows:
-                        sql = self._add_limit_clause(sql, max_rows)
-                    
-                    # Execute query
-                    rows = await conn.fetch(sql)
-                    
-                    # Convert to list of dicts
-                    query_result["rows"] = [dict(row) for row in rows]
-                    query_result["row_count"] = len(query_result["rows"])
-                    query_result["success"] = True
-                    
-                    logger.info(f"Query {idx+1} executed successfully. Rows: {query_result['row_count']}")
-                    
-                except Exception as e:
-                    logger.error(f"Query {idx+1} execution failed: {e}")
-                    query_result["error"] = str(e)
-                
-                results.append(query_result)
+            transaction = conn.transaction()
+            await transaction.start()
+            try:
+                for idx, sql in statements:
+                    result = await self._run_statement(conn, idx, sql, max_rows, args[idx])
+                    results.append(result)
+                    if not result["success"]:
+                        break
+            except BaseException:
+                await transaction.rollback()
+                raise
+            
+            failed = next((r for r in results if not r["success"]), None)
+            if failed is None:
+                await transaction.commit()
+                return results
+            await transaction.rollback()
         
+        reason = f"Query {failed['query_index'] + 1} failed"
+        logger.error(f"Statement batch rolled back: {reason}")
+        for result in results:
+            if result["success"]:
+                result.update(_statement_result(
+                    result["query_index"], result["sql"], f"Rolled back: {reason}"
+                ))
+        results.extend(
+            _statement_result(idx, sql, f"Not executed: {reason}")
+            for idx, sql in statements[len(results):]
+        )
         return results
     
+    async def _run_statement(
+        self,
+        conn: asyncpg.Connection,
+        idx: int,
+        sql: str,
+        max_rows: Optional[int],
+        args: Tuple[Any, ...] = ()
+    ) -> Dict[str, Any]:
+        """Execute one statement of a batch, capturing errors in the result"""
+        query_result = _statement_result(idx, sql)
+        
+        try:
+            # Apply row limit if specified
+            if max_rows:
+                sql = self._add_limit_clause(sql, max_rows)
+            
+            # Execute query; column names come from the statement so
+            # empty results keep them
+            stmt = await conn.prepare_cached(sql)
+            rows = await stmt.fetch(*args)
+            
+            query_result.update(_rows_to_columnar(
+                rows, [attr.name for attr in stmt.get_attributes()]
+            ))
+            query_result["row_count"] = len(rows)
+            query_result["success"] = True
+            
+            logger.info(f"Query {idx+1} executed successfully. Rows: {query_result['row_count']}")
+            
+        except Exception as e:
+            logger.error(f"Query {idx+1} execution failed: {e}")
+            query_result["error"] = str(e)
+            # The statement may be stale; prepare it afresh next time
+            conn.discard_prepared(sql)
+        
+        return query_result
+    
     async def execute_write_query(
         self,
-        sql: str
+        sql: str,
+        args: Tuple[Any, ...] = ()
     ) -> Dict[str, Any]:
-        """Execute INSERT/UPDATE/DELETE query"""
+        """Execute INSERT/UPDATE/DELETE query (args bind $n parameters)"""
         try:
             async with self.pool.acquire() as conn:
-                # For INSERT with RETURNING
-                if "RETURNING" in sql.upper():
-                    result = await conn.fetch(sql)
+                # For INSERT with RETURNING (search from pos avoids copying bulk VALUES)
+                if _RETURNING_RE.search(sql, max(0, len(sql) - _RETURNING_TAIL)):
+                    result = await conn.fetch(sql, *args)
                     return {
                         "success": True,
                         "rows_affected": len(result),
@@ -146,7 +572,7 @@ class DatabaseManager:
                     }
                 else:
                     # For UPDATE/DELETE
-                    result = await conn.execute(sql)
+                    result = await conn.execute(sql, *args)
                     # Extract row count from result status
                     rows_affected = int(result.split()[-1]) if result else 0
                     return {
@@ -157,31 +583,26 @@ class DatabaseManager:
             logger.error(f"Write query execution failed: {e}")
             raise
     
-    async def get_table_schema(self, table_name: str) -> Dict[str, Any]:
-        """Get schema information for a table"""
+    async def get_table_schema(self, table_name: str, schema: str = "public") -> Dict[str, Any]:
+        """Get schema information for a table (cached, see SCHEMA_CACHE_TTL)"""
         try:
-            async with self.pool.acquire() as conn:
-                # Get columns
-                columns = await conn.fetch("""
-                    SELECT 
-                        column_name,
-                        data_type,
-                        is_nullable,
-                        column_default,
-                        character_maximum_length
-                    FROM information_schema.columns
-                    WHERE table_name = $1
-                    ORDER BY ordinal_position
-                """, table_name)
-                
-                # Get row count
-                count = await conn.fetchval(f"SELECT COUNT(*) FROM {table_name}")
-                
-                return {
-                    "table_name": table_name,
-                    "columns": [dict(col) for col in columns],
-                    "row_count": count
-                }
+            columns = await self._cached(
+                ("columns", schema, table_name),
+                settings.SCHEMA_CACHE_TTL,
+                lambda: self._fetch_columns(schema, table_name)
+            )
+            # Row counts drift faster than columns, so they get a shorter TTL
+            count = await self._cached(
+                ("row_count", schema, table_name),
+                settings.ROW_COUNT_CACHE_TTL,
+                lambda: self._fetch_row_count(schema, table_name)
+            )
+            
+            return {
+                "table_name": table_name,
+                "columns": columns,
+                "row_count": count
+            }
         except Exception as e:
             logger.error(f"Failed to get schema for {table_name}: {e}")
             return {
@@ -191,64 +612,277 @@ class DatabaseManager:
                 "error": str(e)
             }
     
+    async def get_tables_schema_bulk(
+        self,
+        table_names: List[str],
+        schema: str = "public"
+    ) -> List[Dict[str, Any]]:
+        """
+        Get schema information for several tables in at most two queries,
+        run concurrently: one joined columns + row-estimate query for tables
+        whose columns are stale, and one row-estimate query for tables where
+        only the (shorter-lived) count is stale.
+        
+        Args:
+            table_names: Tables to describe
+            schema: Schema containing the tables
+            
+        Returns:
+            List of {"table_name", "columns", "row_count"} dicts in input order.
+            Tables whose data could not be loaded carry an "error" key.
+        """
+        columns_by_table: Dict[str, Any] = {}
+        counts_by_table: Dict[str, Any] = {}
+        for table_name in table_names:
+            columns_by_table[table_name] = self._cache_get(("columns", schema, table_name))
+            counts_by_table[table_name] = self._cache_get(("row_count", schema, table_name))
+        
+        stale_columns = [t for t, v in columns_by_table.items() if v is _MISSING]
+        # The joined query refreshes counts for stale_columns tables as well
+        stale_counts = [
+            t for t, v in counts_by_table.items()
+            if v is _MISSING and columns_by_table[t] is not _MISSING
+        ]
+        
+        async def load_columns():
+            async with self.pool.acquire() as conn:
+                rows = await conn.prepared["schema_bulk"].fetch(schema, stale_columns)
+            
+            fetched: Dict[str, List[Dict[str, Any]]] = {t: [] for t in stale_columns}
+            estimates: Dict[str, int] = {}
+            for table_name, table_rows in itertools.groupby(rows, key=lambda r: r['table_name']):
+                columns = fetched[table_name]
+                for row in table_rows:
+                    col = dict(row)
+                    del col['table_name']
+                    estimates[table_name] = col.pop('row_count') or 0
+                    columns.append(col)
+            
+            for table_name, columns in fetched.items():
+                count = estimates.get(table_name, 0)
+                columns_by_table[table_name] = columns
+                counts_by_table[table_name] = count
+                self._cache_put(("columns", schema, table_name), settings.SCHEMA_CACHE_TTL, columns)
+                self._cache_put(("row_count", schema, table_name), settings.ROW_COUNT_CACHE_TTL, count)
+        
+        async def load_counts():
+            async with self.pool.acquire() as conn:
+                rows = await conn.prepared["rowcount_bulk"].fetch(schema, stale_counts)
+            
+            estimates = {row['relname']: row['row_count'] for row in rows}
+            for table_name in stale_counts:
+                count = estimates.get(table_name, 0)
+                counts_by_table[table_name] = count
+                self._cache_put(("row_count", schema, table_name), settings.ROW_COUNT_CACHE_TTL, count)
+        
+        # The two loaders touch disjoint tables; run them on separate pool
+        # connections so a partly stale cache still costs a single RTT
+        loaders = []
+        if stale_columns:
+            loaders.append(load_columns())
+        if stale_counts:
+            loaders.append(load_counts())
+        
+        errors = [
+            str(outcome)
+            for outcome in await asyncio.gather(*loaders, return_exceptions=True)
+            if isinstance(outcome, Exception)
+        ]
+        if errors:
+            logger.error(f"Bulk schema introspection failed for {schema}: {errors}")
+        
+        results = []
+        for table_name in table_names:
+            columns = columns_by_table[table_name]
+            count = counts_by_table[table_name]
+            info = {
+                "table_name": table_name,
+                "columns": [] if columns is _MISSING else columns,
+                "row_count": None if count is _MISSING else count
+            }
+            if columns is _MISSING or count is _MISSING:
+                info["error"] = "; ".join(errors)
+            results.append(info)
+        
+        return results
+    
     async def get_all_tables(self, schema: str = "public") -> List[str]:
-        """Get list of all tables in schema"""
+        """Get list of all tables in schema (cached, see SCHEMA_CACHE_TTL)"""
         try:
-            async with self.pool.acquire() as conn:
-                tables = await conn.fetch("""
-                    SELECT table_name 
-                    FROM information_schema.tables
-                    WHERE table_schema = $1 
-                    AND table_type = 'BASE TABLE'
-                    ORDER BY table_name
-                """, schema)
-                return [table['table_name'] for table in tables]
+            return await self._cached(
+                ("tables", schema),
+                settings.SCHEMA_CACHE_TTL,
+                lambda: self._fetch_tables(schema)
+            )
         except Exception as e:
             logger.error(f"Failed to get tables list: {e}")
             return []
     
-    async def get_table_ddl(self, table_name: str) -> str:
-        """Generate CREATE TABLE statement for a table"""
+    def invalidate_schema_cache(self, schema: Optional[str] = None):
+        """
+        Drop cached introspection results.
+        
+        Args:
+            schema: Only drop entries for this schema (default: drop everything)
+        """
+        if schema is None:
+            self._schema_cache.clear()
+        else:
+            for key in [k for k in self._schema_cache if k[1] == schema]:
+                del self._schema_cache[key]
+        logger.debug(f"Schema cache invalidated (schema={schema or 'all'})")
+    
+    def _cache_get(self, key: Tuple[str, ...]) -> Any:
+        """Return a fresh cached value or _MISSING"""
+        entry = self._schema_cache.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return _MISSING
+    
+    def _cache_put(self, key: Tuple[str, ...], ttl: float, value: Any):
+        """Store a value in the schema cache"""
+        self._schema_cache[key] = (time.monotonic() + ttl, value)
+    
+    async def _cached(
+        self,
+        key: Tuple[str, ...],
+        ttl: float,
+        loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        Return a cached introspection value, loading it on miss.
+        
+        A per-key lock ensures concurrent misses trigger a single DB round trip.
+        """
+        value = self._cache_get(key)
+        if value is not _MISSING:
+            return value
+        
+        lock = self._schema_cache_locks.setdefault(key, asyncio.Lock())
         try:
-            schema_info = await self.get_table_schema(table_name)
-            
-            if not schema_info.get('columns'):
-                return f"-- Table {table_name} not found"
-            
-            ddl = f"CREATE TABLE {table_name} (\n"
-            column_defs = []
-            
-            for col in schema_info['columns']:
-                col_def = f"    {col['column_name']} {col['data_type']}"
-                
-                if col.get('character_maximum_length'):
-                    col_def += f"({col['character_maximum_length']})"
-                
-                if col['is_nullable'] == 'NO':
-                    col_def += " NOT NULL"
+            async with lock:
+                # Another waiter may have filled the entry while we were queued
+                value = self._cache_get(key)
+                if value is not _MISSING:
+                    return value
                 
-                if col.get('column_default'):
-                    col_def += f" DEFAULT {col['column_default']}"
-                
-                column_defs.append(col_def)
-            
-            ddl += ",\n".join(column_defs)
-            ddl += "\n);"
-            
-            return ddl
+                value = await loader()
+                self._cache_put(key, ttl, value)
+                return value
+        finally:
+            # Locks only live while a load is in flight; waiters already
+            # queued keep their reference and find the value cached
+            if self._schema_cache_locks.get(key) is lock:
+                del self._schema_cache_locks[key]
+    
+    async def _fetch_columns(self, schema: str, table_name: str) -> List[Dict[str, Any]]:
+        """Query column definitions for a table"""
+        async with self.pool.acquire() as conn:
+            columns = await conn.prepared["columns"].fetch(schema, table_name)
+            return [dict(col) for col in columns]
+    
+    async def _fetch_row_count(self, schema: str, table_name: str) -> int:
+        """
+        Query the planner's row estimate for a table.
+        
+        pg_class.reltuples is maintained by VACUUM/ANALYZE, so this is O(1)
+        instead of a sequential scan. The value is approximate (and -1 for
+        never-analyzed tables, clamped to 0), which is fine for schema display.
+        """
+        async with self.pool.acquire() as conn:
+            count = await conn.prepared["rowcount"].fetchval(schema, table_name)
+            return count or 0
+    
+    async def _fetch_tables(self, schema: str) -> List[str]:
+        """Query base table names in a schema"""
+        async with self.pool.acquire() as conn:
+            tables = await conn.prepared["tables"].fetch(schema)
+            return [table['table_name'] for table in tables]
+    
+    async def get_table_ddl(self, table_name: str, schema: str = "public") -> str:
+        """
+        Generate CREATE TABLE statement for a table (cached, see SCHEMA_CACHE_TTL)
+        
+        The statement is assembled by Postgres in a single query, with
+        identifiers quoted via format('%I').
+        """
+        try:
+            ddl = await self._cached(
+                ("ddl", schema, table_name),
+                settings.SCHEMA_CACHE_TTL,
+                lambda: self._fetch_table_ddl(schema, table_name)
+            )
+            return ddl or f"-- Table {table_name} not found"
             
         except Exception as e:
             logger.error(f"Failed to generate DDL for {table_name}: {e}")
             return f"-- Error generating DDL: {str(e)}"
     
+    async def get_tables_ddl_bulk(
+        self,
+        table_names: List[str],
+        schema: str = "public"
+    ) -> Dict[str, str]:
+        """
+        Generate CREATE TABLE statements for several tables with one pooled
+        connection and one query for all tables missing from the cache.
+        
+        Args:
+            table_names: Tables to describe
+            schema: Schema containing the tables
+            
+        Returns:
+            Dict of table name to DDL, with the same placeholder comments as
+            get_table_ddl for unknown tables and errors
+        """
+        ddls: Dict[str, Any] = {
+            table_name: self._cache_get(("ddl", schema, table_name))
+            for table_name in table_names
+        }
+        stale = [table_name for table_name, ddl in ddls.items() if ddl is _MISSING]
+        
+        if stale:
+            try:
+                async with self.pool.acquire() as conn:
+                    rows = await conn.prepared["ddl_bulk"].fetch(schema, stale)
+                fetched = {row['table_name']: row['ddl'] for row in rows}
+                for table_name in stale:
+                    ddl = fetched.get(table_name)
+                    ddls[table_name] = ddl
+                    self._cache_put(("ddl", schema, table_name), settings.SCHEMA_CACHE_TTL, ddl)
+            except Exception as e:
+                logger.error(f"Failed to generate DDL for {len(stale)} tables: {e}")
+                for table_name in stale:
+                    ddls[table_name] = f"-- Error generating DDL: {str(e)}"
+        
+        return {
+            table_name: ddl or f"-- Table {table_name} not found"
+            for table_name, ddl in ddls.items()
+        }
+    
+    async def _fetch_table_ddl(self, schema: str, table_name: str) -> Optional[str]:
+        """Query the CREATE TABLE text for a table (None if it has no columns)"""
+        async with self.pool.acquire() as conn:
+            return await conn.prepared["ddl"].fetchval(schema, table_name)
+    
     def _add_limit_clause(self, sql: str, limit: int) -> str:
-        """Add LIMIT clause to SQL query if not present"""
-        sql_upper = sql.upper()
-        if "LIMIT" not in sql_upper:
-            # Handle queries with/without semicolon
-            sql = sql.rstrip(';')
-            sql += f" LIMIT {limit}"
-        return sql
+        """
+        Cap the number of rows a read query can return.
+        
+        Statements already ending in LIMIT are left alone (only the tail is
+        inspected). Anything else is wrapped as a subquery, which stays
+        correct for inner LIMITs, ORDER BY ... OFFSET tails and CTEs. A WITH
+        that modifies data must stay at the top level, so it is not wrapped.
+        """
+        sql = sql.rstrip().rstrip(';').rstrip()
+        if (
+            not _READ_QUERY_RE.match(sql)
+            or _TRAILING_LIMIT_RE.search(sql[-120:])
+            or with_write_keyword(sql)
+        ):
+            return sql
+        # Newlines keep a trailing "-- comment" from swallowing the paren
+        return f"SELECT * FROM (\n{sql}\n) AS _vanna_limited LIMIT {limit}"
     
     @asynccontextmanager
     async def transaction(self):
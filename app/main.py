@@ -20,14 +20,19 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+_SEP = "=" * 70
+_CORS_ORIGINS = tuple(o.strip() for o in settings.CORS_ORIGINS.split(",") if o.strip())
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
     # Startup
-    logger.info("=" * 70)
-    logger.info(f"🚀 Starting {settings.SERVICE_NAME} v{settings.SERVICE_VERSION}")
-    logger.info("=" * 70)
+    banner = logger.isEnabledFor(logging.INFO)
+    if banner:
+        logger.info(_SEP)
+        logger.info(f"🚀 Starting {settings.SERVICE_NAME} v{settings.SERVICE_VERSION}")
+        logger.info(_SEP)
     
     try:
         # Initialize database
@@ -38,19 +43,20 @@ async def lifespan(app: FastAPI):
         logger.info("🤖 Initializing Vanna AI...")
         await vanna_service.initialize()
         
-        logger.info("=" * 70)
-        logger.info("✅ Service ready!")
-        logger.info(f"📡 Listening on http://{settings.HOST}:{settings.PORT}")
-        logger.info("=" * 70)
-        logger.info("\n📚 API Endpoints:")
-        logger.info("  POST /api/generate-sql  - Generate SQL from natural language")
-        logger.info("  POST /api/query         - Generate and execute SQL")
-        logger.info("  POST /api/train-schema  - Train on database schema")
-        logger.info("  GET  /api/schema        - Get database schema info")
-        logger.info("  GET  /api/trained-tables - Get trained tables list")
-        logger.info("  GET  /health            - Health check")
-        logger.info("  GET  /docs              - Interactive API documentation")
-        logger.info("=" * 70)
+        if banner:
+            logger.info(_SEP)
+            logger.info("✅ Service ready!")
+            logger.info(f"📡 Listening on http://{settings.HOST}:{settings.PORT}")
+            logger.info(_SEP)
+            logger.info("\n📚 API Endpoints:")
+            logger.info("  POST /api/generate-sql  - Generate SQL from natural language")
+            logger.info("  POST /api/query         - Generate and execute SQL")
+            logger.info("  POST /api/train-schema  - Train on database schema")
+            logger.info("  GET  /api/schema        - Get database schema info")
+            logger.info("  GET  /api/trained-tables - Get trained tables list")
+            logger.info("  GET  /health            - Health check")
+            logger.info("  GET  /docs              - Interactive API documentation")
+            logger.info(_SEP)
         
         yield
         
@@ -103,7 +109,7 @@ app = FastAPI(
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=settings.CORS_ORIGINS.split(","),
+    allow_origins=_CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -128,10 +134,16 @@ async def root():
 if __name__ == "__main__":
     import uvicorn
     
+    # Same event loop and HTTP parser as the Dockerfile (uvicorn[standard]);
+    # failing loudly beats silently falling back to asyncio/h11
     uvicorn.run(
-        "vanna_sql_service.main:app",
+        "app.main:app",
         host=settings.HOST,
         port=settings.PORT,
-        reload=True,
+        loop="uvloop",
+        http="httptools",
+        workers=settings.WORKERS,
+        # Development only: reload supervises a single process and ignores workers
+        reload=settings.DEBUG,
         log_level=settings.LOG_LEVEL.lower()
     )
@@ -4,6 +4,7 @@ from .schemas import (
     SQLGenerationResponse,
     SchemaTrainingRequest,
     SchemaTrainingResponse,
+    TrainingJobResponse,
     HealthResponse,
     SchemaInfo,
     SchemaResponse
@@ -14,6 +15,7 @@ __all__ = [
     "SQLGenerationResponse",
     "SchemaTrainingRequest",
     "SchemaTrainingResponse",
+    "TrainingJobResponse",
     "HealthResponse",
     "SchemaInfo",
     "SchemaResponse"
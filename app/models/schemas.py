@@ -1,10 +1,14 @@
 """
 Pydantic models for API requests and responses
 """
-from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Optional, List, Dict, Any, Literal, Union
 from datetime import datetime
 
+# Response models are built once per request and never mutated; frozen
+# makes that explicit and lets them be shared safely
+_RESPONSE_CONFIG = ConfigDict(frozen=True)
+
 
 class SQLGenerationRequest(BaseModel):
     """Request model for SQL generation"""
@@ -14,34 +18,42 @@ class SQLGenerationRequest(BaseModel):
     role: Optional[str] = Field(None, description="User role (auto-detected from database if not provided)")
     execute: bool = Field(False, description="Whether to execute the generated SQL")
     max_rows: Optional[int] = Field(None, description="Maximum rows to return")
-
-
-class SQLSecurityMetadata(BaseModel):
-    """Metadata for SQL security validation"""
-    security_validated: bool = Field(True, description="Whether SQL passed security validation")
-    role_level: Optional[int] = Field(None, description="User's role level (1=employee, 5=admin)")
-    validation_warnings: Optional[List[str]] = Field(None, description="Security warnings (non-blocking)")
-    validation_errors: Optional[List[str]] = Field(None, description="Security errors (blocking)")
-    modifications: Optional[List[str]] = Field(None, description="Modifications made to SQL (e.g., placeholder replacements)")
+    use_cache: bool = Field(True, description="Reuse previously generated SQL for identical read-only questions")
+    result_format: Literal["records", "columnar"] = Field(
+        "records",
+        description="Row layout for executed SELECTs: 'records' (list of dicts) or 'columnar' (columns + list of value lists)"
+    )
 
 
 class QueryResult(BaseModel):
     """Result of a single SQL query execution"""
+    model_config = _RESPONSE_CONFIG
+    
     query_index: int = Field(..., description="Index of this query in the batch (0-based)")
     sql: str = Field(..., description="The SQL statement that was executed")
     success: bool = Field(..., description="Whether this query executed successfully")
-    rows: List[Dict[str, Any]] = Field(default_factory=list, description="Query result rows")
+    columns: List[str] = Field(default_factory=list, description="Result column names")
+    rows: Union[List[Dict[str, Any]], List[List[Any]]] = Field(
+        default_factory=list,
+        description="Query result rows, shaped by result_format"
+    )
     row_count: int = Field(0, description="Number of rows returned")
     error: Optional[str] = Field(None, description="Error message if query failed")
 
 
 class SQLGenerationResponse(BaseModel):
     """Response model for SQL generation"""
+    model_config = _RESPONSE_CONFIG
+    
     success: bool
     sql: Optional[str] = None
-    results: Optional[List[Dict[str, Any]]] = Field(
+    columns: Optional[List[str]] = Field(
+        None,
+        description="Result column names (for single query execution)"
+    )
+    results: Optional[Union[List[Dict[str, Any]], List[List[Any]]]] = Field(
         None, 
-        description="Query results (for single query execution)"
+        description="Query results (for single query execution), shaped by result_format"
     )
     row_count: Optional[int] = Field(
         None, 
@@ -87,19 +99,41 @@ class SchemaTrainingRequest(BaseModel):
     schema_name: Optional[str] = Field(None, description="Specific schema to train (e.g., 'hrms')")
     tables: Optional[List[str]] = Field(None, description="Specific tables to train")
     include_sample_data: bool = Field(True, description="Include sample queries")
+    background: bool = Field(False, description="Train in a background job and return its job_id immediately")
 
 
 class SchemaTrainingResponse(BaseModel):
     """Response model for schema training"""
+    model_config = _RESPONSE_CONFIG
+    
     success: bool
     message: str
     tables_trained: List[str]
     sample_questions: Optional[List[str]] = None
+    job_id: Optional[str] = None  # Set when training runs in the background
+    error: Optional[str] = None
+
+
+class TrainingJobResponse(BaseModel):
+    """Progress of a background schema training job"""
+    model_config = _RESPONSE_CONFIG
+    
+    job_id: str
+    status: str  # running | completed | failed
+    schema_name: Optional[str] = None
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    total_tables: Optional[int] = None
+    tables_trained: List[str]
+    eta_seconds: Optional[float] = None
+    sample_questions: Optional[List[str]] = None
     error: Optional[str] = None
 
 
 class HealthResponse(BaseModel):
     """Health check response"""
+    model_config = _RESPONSE_CONFIG
+    
     status: str
     service: str
     version: str
@@ -111,6 +145,8 @@ class HealthResponse(BaseModel):
 
 class SchemaInfo(BaseModel):
     """Database schema information"""
+    model_config = _RESPONSE_CONFIG
+    
     table_name: str
     columns: List[Dict[str, Any]]
     row_count: Optional[int] = None
@@ -118,8 +154,11 @@ class SchemaInfo(BaseModel):
 
 class SchemaResponse(BaseModel):
     """Response for schema listing"""
+    model_config = _RESPONSE_CONFIG
+    
     success: bool
     schemas: List[str]
     tables: List[SchemaInfo]
     total_tables: int
+    warnings: Optional[List[str]] = Field(None, description="Partial introspection failures")
     error: Optional[str] = None
@@ -1,13 +1,23 @@
 """
 YAML schema configuration loader for Vanna training
 """
+import os
+import threading
 import yaml
 import logging
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional, List, Dict, Tuple
 
 from .models import SchemaTrainingConfig
 
+# libyaml-backed loader when PyYAML was built with it (several times faster)
+try:
+    from yaml import CSafeLoader as _YamlLoader
+    LIBYAML_AVAILABLE = True
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+    LIBYAML_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
 
@@ -23,11 +33,19 @@ class SchemaConfigLoader:
                         Defaults to the directory containing this module.
         """
         self.schemas_dir = schemas_dir or Path(__file__).parent
+        # schema_name -> (path, mtime_ns, size, config); reparsed when the file changes
+        self._parsed: Dict[str, Tuple[Path, int, int, SchemaTrainingConfig]] = {}
+        self._parsed_lock = threading.Lock()
+        # (directory mtime_ns, schema names); adding/removing files bumps the mtime
+        self._schema_list: Optional[Tuple[int, List[str]]] = None
     
     def load(self, schema_name: str) -> SchemaTrainingConfig:
         """
         Load and validate a schema YAML configuration file.
         
+        The parsed config is cached and reused while the file's mtime and
+        size are unchanged; callers must treat it as read-only.
+        
         Args:
             schema_name: Name of the schema (without .yaml extension)
             
@@ -48,17 +66,44 @@ class SchemaConfigLoader:
                     f"Schema config not found: {schema_name}.yaml in {self.schemas_dir}"
                 )
         
+        stat = file_path.stat()
+        with self._parsed_lock:
+            cached = self._parsed.get(schema_name)
+            if cached and cached[:3] == (file_path, stat.st_mtime_ns, stat.st_size):
+                logger.debug(f"Using cached schema config for: {schema_name}")
+                return cached[3]
+            
+            config = self._parse(schema_name, file_path)
+            self._parsed[schema_name] = (file_path, stat.st_mtime_ns, stat.st_size, config)
+            return config
+    
+    def invalidate(self, schema_name: Optional[str] = None):
+        """
+        Drop cached parsed configs.
+        
+        Args:
+            schema_name: Only drop this schema (default: drop all)
+        """
+        with self._parsed_lock:
+            if schema_name is None:
+                self._parsed.clear()
+            else:
+                self._parsed.pop(schema_name, None)
+    
+    def _parse(self, schema_name: str, file_path: Path) -> SchemaTrainingConfig:
+        """Read, parse and validate a schema YAML file"""
         logger.info(f"📖 Loading schema config from: {file_path}")
         
         try:
+            # Parse from one contiguous buffer rather than a file wrapper
             with open(file_path, 'r', encoding='utf-8') as f:
-                data = yaml.safe_load(f)
+                data = yaml.load(f.read(), Loader=_YamlLoader)
             
             if not data:
                 raise ValueError(f"Empty schema config: {file_path}")
             
-            # Validate using Pydantic model
-            config = SchemaTrainingConfig(**data)
+            # Validate the parsed mapping directly (no kwargs re-packing)
+            config = SchemaTrainingConfig.model_validate(data)
             
             logger.info(
                 f"✅ Loaded schema '{config.schema_info.name}' v{config.schema_info.version}: "
@@ -78,13 +123,25 @@ class SchemaConfigLoader:
         """
         List available schema configuration files.
         
+        The listing is cached until the directory's mtime changes.
+        
         Returns:
             List of schema names (without extension)
         """
-        schemas = []
-        for ext in ['*.yaml', '*.yml']:
-            schemas.extend([f.stem for f in self.schemas_dir.glob(ext)])
-        return sorted(set(schemas))
+        mtime = self.schemas_dir.stat().st_mtime_ns
+        cached = self._schema_list
+        if cached is not None and cached[0] == mtime:
+            return list(cached[1])
+        
+        with os.scandir(self.schemas_dir) as entries:
+            schemas = sorted({
+                os.path.splitext(entry.name)[0]
+                for entry in entries
+                if entry.name.endswith(('.yaml', '.yml')) and entry.is_file()
+            })
+        
+        self._schema_list = (mtime, schemas)
+        return list(schemas)
     
     def schema_exists(self, schema_name: str) -> bool:
         """
@@ -1,5 +1,14 @@
 """Services package"""
 from .vanna_service import vanna_service, VannaSQLService
 from .sql_validator import SQLSecurityValidator, ValidationResult, RoleLevel
+from .sql_cache import sql_cache, SQLResponseCache, semantic_sql_cache, SemanticSQLCache
+from .batcher import generation_coalescer, RequestCoalescer
+from .schema_cache import schema_cache, SchemaCache
+from .jobs import training_jobs, TrainingJob, clear_training_caches
 
-__all__ = ["vanna_service", "VannaSQLService", "SQLSecurityValidator", "ValidationResult", "RoleLevel"]
+__all__ = [
+    "vanna_service", "VannaSQLService", "SQLSecurityValidator", "ValidationResult", "RoleLevel",
+    "sql_cache", "SQLResponseCache", "semantic_sql_cache", "SemanticSQLCache",
+    "generation_coalescer", "RequestCoalescer", "training_jobs", "TrainingJob", "clear_training_caches",
+    "schema_cache", "SchemaCache"
+]
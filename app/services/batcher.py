@@ -0,0 +1,83 @@
+"""
+Coalescing of concurrent SQL generation requests.
+
+The Vanna agent handles one message per LLM call, so there is no batch
+endpoint to fill. What concurrent traffic does offer is duplication: the
+same question from the same user/role arriving while an earlier copy is
+still being generated. Those callers share a single in-flight generation.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RequestCoalescer:
+    """
+    Single-flight execution keyed by request identity, with a cap on how
+    many distinct generations run at once.
+    """
+    
+    def __init__(self, max_concurrency: int = 16):
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Strong references so running tasks are not garbage collected
+        self._tasks: Dict[str, asyncio.Task] = {}
+    
+    async def submit(
+        self,
+        key: str,
+        factory: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """
+        Run factory() for key, or join the run already in flight for key.
+        
+        The run is a separate task, so a caller disconnecting does not
+        cancel it for the others.
+        
+        Returns:
+            A shallow copy of the shared result
+        """
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._inflight[key] = future
+            self._tasks[key] = asyncio.create_task(self._run(key, factory, future))
+        else:
+            logger.info(f"Joining in-flight generation ({len(self._inflight)} in flight)")
+        
+        return dict(await asyncio.shield(future))
+    
+    async def _run(
+        self,
+        key: str,
+        factory: Callable[[], Awaitable[Dict[str, Any]]],
+        future: asyncio.Future
+    ):
+        """Execute one generation and publish its outcome to all waiters"""
+        try:
+            async with self._semaphore:
+                result = await factory()
+            future.set_result(result)
+        except asyncio.CancelledError:
+            # Waiters see the cancellation; the task itself stays cancelled
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure is not logged as lost
+            future.exception()
+        finally:
+            self._inflight.pop(key, None)
+            self._tasks.pop(key, None)
+    
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+
+# Global coalescer for generate-only requests
+generation_coalescer = RequestCoalescer(max_concurrency=settings.GENERATION_MAX_CONCURRENCY)
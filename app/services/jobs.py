@@ -0,0 +1,142 @@
+"""
+Background schema training jobs
+
+Training embeds DDL for every table and can take minutes, so
+/api/train-schema can hand it to a background task and let clients poll
+for progress instead of holding the request open.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .vanna_service import vanna_service
+from .sql_cache import sql_cache, semantic_sql_cache
+from .schema_cache import schema_cache
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs kept for polling; oldest are dropped first
+MAX_FINISHED_JOBS = 100
+
+
+def clear_training_caches():
+    """
+    Drop generated SQL and schema responses that depend on the training
+    context. Called before and after each training run: anything produced
+    while training was in progress saw partial context.
+    """
+    sql_cache.clear()
+    semantic_sql_cache.clear()
+    schema_cache.clear()
+
+
+@dataclass
+class TrainingJob:
+    """State of one background training run"""
+    job_id: str
+    schema_name: Optional[str]
+    tables: Optional[List[str]]
+    status: str = "running"  # running | completed | failed
+    started_at: datetime = field(default_factory=datetime.now)
+    finished_at: Optional[datetime] = None
+    total_tables: Optional[int] = None
+    tables_trained: List[str] = field(default_factory=list)
+    sample_questions: Optional[List[str]] = None
+    error: Optional[str] = None
+    _started: float = field(default_factory=time.monotonic, repr=False)
+    
+    def record_table(self, table_name: str, total_tables: int):
+        """Progress callback for VannaSQLService.train_on_database_schema"""
+        self.total_tables = total_tables
+        self.tables_trained.append(table_name)
+    
+    @property
+    def eta_seconds(self) -> Optional[float]:
+        """Remaining time extrapolated from the average per-table duration"""
+        if self.status != "running" or not self.total_tables or not self.tables_trained:
+            return None
+        done = len(self.tables_trained)
+        per_table = (time.monotonic() - self._started) / done
+        return round(per_table * max(self.total_tables - done, 0), 1)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Public view of the job for the progress endpoint"""
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "schema_name": self.schema_name,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "total_tables": self.total_tables,
+            "tables_trained": list(self.tables_trained),
+            "eta_seconds": self.eta_seconds,
+            "sample_questions": self.sample_questions,
+            "error": self.error
+        }
+
+
+class TrainingJobManager:
+    """In-memory registry of training jobs for this worker process"""
+    
+    def __init__(self, max_finished: int = MAX_FINISHED_JOBS):
+        self.max_finished = max_finished
+        self._jobs: "OrderedDict[str, TrainingJob]" = OrderedDict()
+        # Strong references so running tasks are not garbage collected
+        self._tasks: Dict[str, asyncio.Task] = {}
+    
+    def start(self, tables: Optional[List[str]] = None, schema_name: Optional[str] = None) -> TrainingJob:
+        """Create a job and schedule its training run"""
+        job = TrainingJob(job_id=uuid.uuid4().hex, schema_name=schema_name, tables=tables)
+        self._jobs[job.job_id] = job
+        self._tasks[job.job_id] = asyncio.create_task(self._run(job))
+        self._prune()
+        
+        logger.info(f"📚 Started training job {job.job_id}")
+        return job
+    
+    def get(self, job_id: str) -> Optional[TrainingJob]:
+        """Return the job with this id, or None"""
+        return self._jobs.get(job_id)
+    
+    async def _run(self, job: TrainingJob):
+        """Run training for a job and record the outcome"""
+        try:
+            result = await vanna_service.train_on_database_schema(
+                tables=job.tables,
+                schema_name=job.schema_name,
+                progress=job.record_table
+            )
+            
+            # SQL generated while training was in progress saw partial context
+            clear_training_caches()
+            
+            if result['success']:
+                job.tables_trained = result['tables_trained']
+                job.sample_questions = result.get('sample_questions')
+                job.status = "completed"
+            else:
+                job.error = result.get('error')
+                job.status = "failed"
+        except Exception as e:
+            logger.error(f"❌ Training job {job.job_id} failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = datetime.now()
+            self._tasks.pop(job.job_id, None)
+            logger.info(f"📚 Training job {job.job_id} {job.status}")
+    
+    def _prune(self):
+        """Drop the oldest finished jobs beyond max_finished"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.status != "running"]
+        for job_id in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self._jobs[job_id]
+
+
+# Global training job registry
+training_jobs = TrainingJobManager()
@@ -0,0 +1,193 @@
+"""
+Qdrant agent memory with batched writes for schema training.
+
+vanna's QdrantAgentMemory upserts one point per save_text_memory call,
+while a training run saves hundreds of items. TrainingAgentMemory adds a
+batch save on top of it. That needs the parent's Qdrant client, embedding
+function and executor, which vanna keeps private, so every such access
+lives in this class and vanna is pinned to the release it was written
+against (see requirements.txt).
+"""
+import asyncio
+import hashlib
+import logging
+import uuid
+from datetime import datetime
+from typing import List, Optional
+
+from vanna.integrations.qdrant import QdrantAgentMemory
+from vanna.core.tool.models import ToolContext
+from qdrant_client.models import FieldCondition, Filter, MatchValue, PointIdsList, PointStruct
+
+logger = logging.getLogger(__name__)
+
+
+def _content_hash(content: str) -> str:
+    """128-bit content digest, stored in the point payload and used as its id"""
+    return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+
+def _point_id(content_hash: str) -> str:
+    """Qdrant point id (a UUID string) for a content hash"""
+    return str(uuid.UUID(hex=content_hash))
+
+
+class TrainingAgentMemory(QdrantAgentMemory):
+    """QdrantAgentMemory with idempotent batch saves of text memories"""
+    
+    async def save_text_memories_batch(
+        self,
+        contents: List[str],
+        context: ToolContext,
+        batch_size: int = 64
+    ) -> List[Optional[str]]:
+        """
+        Save many text memories with one Qdrant upsert per batch_size items.
+        
+        Points carry the same vector and payload keys as save_text_memory
+        (content, timestamp, is_text_memory; vanna 2.0.1 stores nothing from
+        the ToolContext), plus content_hash. The point id is derived from
+        that hash instead of uuid4, so content already stored is skipped
+        without being embedded again. A batch whose upsert fails is retried
+        item by item, still with content-hash ids.
+        
+        Returns:
+            One entry per content: None on success, otherwise the error message
+        """
+        loop = asyncio.get_running_loop()
+        failures: List[Optional[str]] = []
+        for start in range(0, len(contents), batch_size):
+            chunk = contents[start:start + batch_size]
+            try:
+                skipped = await loop.run_in_executor(self._executor, self._upsert_new, chunk)
+                if skipped:
+                    logger.debug("Skipped %d/%d memories already stored", skipped, len(chunk))
+                failures.extend([None] * len(chunk))
+                continue
+            except Exception as e:
+                logger.warning(f"Batch upsert of {len(chunk)} memories failed, saving individually: {e}")
+            
+            for content in chunk:
+                try:
+                    await loop.run_in_executor(self._executor, self._upsert_new, [content])
+                    failures.append(None)
+                except Exception as e:
+                    failures.append(str(e))
+        
+        return failures
+    
+    def _create_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed many texts in one call.
+        
+        vanna 2.0.1's embedding is a per-text hash with no batch form, so
+        this maps it; an embedding backend with a batch API overrides here.
+        """
+        return [self._create_embedding(text) for text in texts]
+    
+    def _upsert_new(self, chunk: List[str]) -> int:
+        """Upsert the contents of chunk not yet stored; returns how many were skipped"""
+        client = self._get_client()
+        hashes = [_content_hash(content) for content in chunk]
+        point_ids = [_point_id(content_hash) for content_hash in hashes]
+        
+        # Ids already in the collection (or repeated within this chunk) are skipped
+        stored = {
+            str(record.id)
+            for record in client.retrieve(
+                collection_name=self.collection_name,
+                ids=list(set(point_ids)),
+                with_payload=False,
+                with_vectors=False
+            )
+        }
+        
+        new_items = []
+        for item in zip(chunk, hashes, point_ids):
+            if item[2] not in stored:
+                stored.add(item[2])
+                new_items.append(item)
+        
+        # One embedding call for everything new in the chunk
+        vectors = self._create_embeddings([content for content, _, _ in new_items])
+        
+        timestamp = datetime.now().isoformat()
+        points = [
+            PointStruct(
+                id=point_id,
+                vector=vector,
+                payload={
+                    "content": content,
+                    "content_hash": content_hash,
+                    "timestamp": timestamp,
+                    "is_text_memory": True
+                }
+            )
+            for (content, content_hash, point_id), vector in zip(new_items, vectors)
+        ]
+        
+        if points:
+            client.upsert(collection_name=self.collection_name, points=points)
+        return len(chunk) - len(points)
+    
+    async def remove_duplicate_text_memories(self) -> int:
+        """
+        Delete text memories stored twice: once under a random id (saved by
+        save_text_memory, or by training before ids were content hashes) and
+        once under their content-hash id. The content-hash copy is kept.
+        
+        Returns:
+            Number of points deleted
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._remove_duplicates)
+    
+    def _remove_duplicates(self) -> int:
+        """Blocking body of remove_duplicate_text_memories"""
+        client = self._get_client()
+        
+        # Random-id text memories, mapped to the id their content hashes to
+        legacy = {}
+        offset = None
+        while True:
+            records, offset = client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=Filter(must=[
+                    FieldCondition(key="is_text_memory", match=MatchValue(value=True))
+                ]),
+                limit=1000,
+                offset=offset,
+                with_payload=["content"],
+                with_vectors=False
+            )
+            for record in records:
+                point_id = _point_id(_content_hash(record.payload.get("content", "")))
+                if str(record.id) != point_id:
+                    legacy[str(record.id)] = point_id
+            if offset is None:
+                break
+        
+        if not legacy:
+            return 0
+        
+        hashed_ids = list(set(legacy.values()))
+        stored = set()
+        for start in range(0, len(hashed_ids), 1000):
+            stored.update(
+                str(record.id)
+                for record in client.retrieve(
+                    collection_name=self.collection_name,
+                    ids=hashed_ids[start:start + 1000],
+                    with_payload=False,
+                    with_vectors=False
+                )
+            )
+        
+        duplicates = [legacy_id for legacy_id, point_id in legacy.items() if point_id in stored]
+        if duplicates:
+            client.delete(
+                collection_name=self.collection_name,
+                points_selector=PointIdsList(points=duplicates)
+            )
+            logger.info(f"🧹 Removed {len(duplicates)} duplicate text memories")
+        return len(duplicates)
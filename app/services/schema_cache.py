@@ -0,0 +1,71 @@
+"""
+Serialized response cache for schema listing endpoints.
+
+/api/schema and /api/trained-tables only change when the service is
+retrained, so their JSON is kept with an ETag and revalidated by clients
+with If-None-Match instead of being rebuilt on every GET.
+"""
+import hashlib
+import time
+from typing import Dict, Hashable, NamedTuple, Optional
+
+from ..config import settings
+
+
+class CachedResponse(NamedTuple):
+    """Encoded JSON body and its validator"""
+    etag: str
+    payload: bytes
+    built_at: float
+
+
+def make_etag(payload: bytes) -> str:
+    """Strong ETag derived from the response body"""
+    return f'"{hashlib.blake2b(payload, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header (single, list, weak or *) against etag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
+
+
+class SchemaCache:
+    """TTL cache of encoded responses keyed by endpoint and parameters"""
+    
+    def __init__(self, ttl: float = 60):
+        self.ttl = ttl
+        self._entries: Dict[Hashable, CachedResponse] = {}
+    
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        """Return a fresh cached response for key, or None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.built_at >= self.ttl:
+            del self._entries[key]
+            return None
+        return entry
+    
+    def put(self, key: Hashable, payload: bytes) -> CachedResponse:
+        """Store an encoded response body and return its entry"""
+        entry = CachedResponse(make_etag(payload), payload, time.monotonic())
+        self._entries[key] = entry
+        return entry
+    
+    def clear(self):
+        """Drop all entries (called when training changes schema or tables)"""
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Global schema response cache
+schema_cache = SchemaCache(ttl=settings.SCHEMA_RESPONSE_CACHE_TTL)
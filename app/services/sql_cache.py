@@ -0,0 +1,256 @@
+"""
+In-process caches for generated SQL.
+
+Only the generation result (SQL, explanation, validation metadata) is
+cached - never executed rows - so a repeated question skips the LLM round
+trip but still runs against live data.
+
+- SQLResponseCache: exact match on the normalized question
+- SemanticSQLCache: nearest previously seen question by cosine similarity
+"""
+import hashlib
+import math
+import re
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from ..config import settings
+
+# Fields of a successful generate_sql result worth keeping
+_CACHED_FIELDS = ("sql", "explanation", "metadata")
+
+# Question tokens for similarity; filler words carry no intent
+_TOKEN_RE = re.compile(r'[a-z0-9_]+')
+_STOPWORDS = frozenset({
+    "a", "an", "the", "of", "for", "to", "in", "on", "at", "by", "with",
+    "me", "please", "can", "you", "could", "would", "is", "are", "be",
+    "show", "list", "get", "give", "display", "find", "what", "which", "all"
+})
+
+# Parts of a question that change its meaning while barely moving the
+# cosine. A semantic hit requires them to match exactly.
+_LITERAL_RE = re.compile(r"(?<!\w)'[^']*'|\"[^\"]*\"|\b\w*\d\w*\b")  # quoted values, numbers
+_PROPER_NOUN_RE = re.compile(r'(?<=\s)[A-Z]\w*')  # capitalized words after the first
+_NEGATION_RE = re.compile(
+    r"\b(?:not|no|never|none|nor|without|except|excluding)\b|n't", re.IGNORECASE
+)
+
+
+def _cached_result(value: Dict[str, Any], **cache_metadata: Any) -> Dict[str, Any]:
+    """Rebuild a generate_sql-shaped result from a cached entry"""
+    return {
+        "success": True,
+        **value,
+        "execution_time": 0.0,
+        "metadata": {**(value.get("metadata") or {}), **cache_metadata}
+    }
+
+
+def _embed(text: str) -> Dict[str, float]:
+    """L2-normalized bag-of-words vector for a question"""
+    counts = Counter(t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS)
+    norm = math.sqrt(sum(c * c for c in counts.values()))
+    return {token: c / norm for token, c in counts.items()} if norm else {}
+
+
+def _signature(text: str) -> Tuple[str, ...]:
+    """Literals, numbers, proper nouns and negations of a question, sorted"""
+    return tuple(sorted(
+        _LITERAL_RE.findall(text)
+        + _PROPER_NOUN_RE.findall(text)
+        + [negation.lower() for negation in _NEGATION_RE.findall(text)]
+    ))
+
+
+def _cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
+    """Dot product of two normalized sparse vectors"""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(token, 0.0) for token, weight in a.items())
+
+
+class SQLResponseCache:
+    """LRU cache with a per-entry TTL for generate_sql results"""
+    
+    def __init__(self, maxsize: int = 2048, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+    
+    @staticmethod
+    def make_key(
+        question: str,
+        context: Optional[str] = None,
+        role: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> str:
+        """
+        Build a cache key from the normalized question and request context.
+        
+        user_id is part of the key because validated SQL embeds the caller's
+        id and is checked against their role.
+        """
+        normalized = " ".join(question.lower().split())
+        raw = f"{normalized}|{context or ''}|{role or ''}|{user_id or ''}"
+        return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a fresh generation result for key, or None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        
+        self._entries.move_to_end(key)
+        return _cached_result(value, cache_hit=True)
+    
+    def put(self, key: str, result: Dict[str, Any]):
+        """Store the cacheable fields of a successful generation result"""
+        self._entries[key] = (
+            time.monotonic() + self.ttl,
+            {name: result.get(name) for name in _CACHED_FIELDS}
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+    
+    def clear(self):
+        """Drop all entries (e.g. after retraining changes the context)"""
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SemanticSQLCache:
+    """
+    LRU + TTL cache that returns SQL generated for the most similar earlier
+    question within the same scope (context, role, user).
+    
+    Vanna's Qdrant memory hashes text instead of embedding it, so similarity
+    is cosine over normalized bag-of-words vectors. That matches rewordings
+    ("list pending leaves" / "show all the pending leaves"), but a long
+    question changed in one word still scores above any useful threshold.
+    A hit therefore also requires identical quoted values, numbers, proper
+    nouns and negations (see _signature); other single-word changes, such
+    as "approved" for "pending", can still match. Off by default
+    (SEMANTIC_CACHE_ENABLED).
+    
+    Closer-but-not-close-enough questions (above exemplar_threshold) are
+    still useful as a worked example in the LLM prompt; those need no
+    signature match.
+    """
+    
+    def __init__(
+        self,
+        capacity: int = 1024,
+        ttl: float = 3600,
+        threshold: float = 0.92,
+        exemplar_threshold: float = 0.75
+    ):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.threshold = threshold
+        self.exemplar_threshold = exemplar_threshold
+        # key -> (expires_at, scope, vector, value, question, signature)
+        self._entries: "OrderedDict[str, Tuple[float, Tuple, Dict[str, float], Dict[str, Any], str, Tuple[str, ...]]]" = OrderedDict()
+    
+    def _nearest(
+        self,
+        question: str,
+        scope: Tuple,
+        min_score: float,
+        exact_signature: bool = False
+    ) -> Tuple[Optional[str], float]:
+        """
+        Key and similarity of the closest live entry in scope scoring at
+        least min_score (and with the same _signature if exact_signature)
+        """
+        vector = _embed(question)
+        signature = _signature(question) if exact_signature else None
+        if not vector:
+            return None, 0.0
+        
+        now = time.monotonic()
+        best_key, best_score = None, min_score
+        for key, (expires_at, entry_scope, entry_vector, _, _, entry_signature) in list(self._entries.items()):
+            if expires_at <= now:
+                del self._entries[key]
+                continue
+            if entry_scope != scope or (exact_signature and entry_signature != signature):
+                continue
+            score = _cosine(vector, entry_vector)
+            if score >= best_score:
+                best_key, best_score = key, score
+        
+        return best_key, best_score
+    
+    def get(self, question: str, scope: Tuple) -> Optional[Dict[str, Any]]:
+        """Return the cached result of the closest question above threshold, or None"""
+        best_key, best_score = self._nearest(question, scope, self.threshold, exact_signature=True)
+        if best_key is None:
+            return None
+        
+        self._entries.move_to_end(best_key)
+        return _cached_result(
+            self._entries[best_key][3],
+            cache_hit="semantic",
+            cache_similarity=round(best_score, 4)
+        )
+    
+    def exemplar(self, question: str, scope: Tuple) -> Optional[Tuple[str, str]]:
+        """
+        Return (question, sql) of the closest earlier question above
+        exemplar_threshold, for use as a few-shot example, or None.
+        """
+        best_key, _ = self._nearest(question, scope, self.exemplar_threshold)
+        if best_key is None:
+            return None
+        
+        entry = self._entries[best_key]
+        return entry[4], entry[3]["sql"]
+    
+    def put(self, question: str, scope: Tuple, result: Dict[str, Any]):
+        """Store the cacheable fields of a successful generation result"""
+        vector = _embed(question)
+        if not vector:
+            return
+        
+        key = SQLResponseCache.make_key(question, *scope)
+        self._entries[key] = (
+            time.monotonic() + self.ttl,
+            scope,
+            vector,
+            {name: result.get(name) for name in _CACHED_FIELDS},
+            question,
+            _signature(question)
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+    
+    def clear(self):
+        """Drop all entries"""
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Global SQL cache instances
+sql_cache = SQLResponseCache(
+    maxsize=settings.SQL_CACHE_MAX_SIZE,
+    ttl=settings.SQL_CACHE_TTL
+)
+
+semantic_sql_cache = SemanticSQLCache(
+    capacity=settings.SEMANTIC_CACHE_CAPACITY,
+    ttl=settings.SQL_CACHE_TTL,
+    threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+    exemplar_threshold=settings.SEMANTIC_EXEMPLAR_THRESHOLD
+)
@@ -40,6 +40,27 @@ ROLE_LEVEL_MAP: Dict[str, int] = {
     "super_admin": RoleLevel.SUPER_ADMIN,
 }
 
+# Leading keyword of a statement, skipping whitespace and comments. Each
+# alternative matches one way only, so a failed match backtracks in linear
+# time (nested "\s+" in the starred group made it exponential)
+_FIRST_KW_RE = re.compile(r'(?:\s|--[^\n]*(?:\n|$)|/\*(?:[^*]|\*(?!/))*\*/)*([A-Za-z]+)')
+
+
+# Unfiltered "SELECT * FROM" check (WHERE is matched anywhere, as before)
+_SELECT_STAR_RE = re.compile(r'SELECT\s+\*\s+FROM', re.IGNORECASE)
+_WHERE_RE = re.compile(r'WHERE', re.IGNORECASE)
+
+
+def sql_operation(sql: str) -> str:
+    """
+    Return the upper-cased leading keyword of a SQL statement.
+    
+    Only leading comments/whitespace and the first token are scanned, so
+    this stays cheap for large bulk INSERTs. Returns '' if there is none.
+    """
+    match = _FIRST_KW_RE.match(sql)
+    return match.group(1).upper() if match else ''
+
 
 @dataclass
 class ValidationResult:
@@ -94,6 +115,12 @@ class SQLSecurityValidator:
     # Tables that contain sensitive data
     SENSITIVE_TABLES = ['employees', 'payroll', 'performance_reviews', 'salaries']
     
+    # SENSITIVE_TABLES as case-insensitive word patterns, compiled once
+    _SENSITIVE_TABLE_RES: List[Tuple[str, "re.Pattern[str]"]] = [
+        (table, re.compile(rf'\b{re.escape(table)}\b', re.IGNORECASE))
+        for table in SENSITIVE_TABLES
+    ]
+    
     def __init__(self, settings: Optional[Any] = None):
         """
         Initialize the validator.
@@ -101,9 +128,9 @@ class SQLSecurityValidator:
         Args:
             settings: Application settings for allowed operations
         """
-        self.allowed_operations = settings.ALLOWED_OPERATIONS if settings else [
+        self.allowed_operations = settings.ALLOWED_OPERATIONS if settings else frozenset({
             "SELECT", "INSERT", "UPDATE", "DELETE"
-        ]
+        })
     
     def get_role_level(self, role_name: Optional[str]) -> int:
         """
@@ -217,7 +244,6 @@ class SQLSecurityValidator:
             List of injection warnings/errors
         """
         errors = []
-        sql_upper = sql.upper()
         
         for pattern, message in self.INJECTION_PATTERNS:
             if re.search(pattern, sql, re.IGNORECASE):
@@ -269,7 +295,7 @@ class SQLSecurityValidator:
                     modifications.append(f"Replaced user ID placeholder with '{user_id}'")
         
         # Replace $TEAM_MEMBER_IDS
-        team_ids = metadata.get('team_member_ids', [])
+        team_ids = metadata.get('team_member_ids')
         if team_ids:
             team_ids_str = ", ".join([f"'{id}'" for id in team_ids])
             patterns = [r'\$TEAM_MEMBER_IDS', r'\{TEAM_MEMBER_IDS\}']
@@ -279,7 +305,7 @@ class SQLSecurityValidator:
                     modifications.append(f"Replaced team member IDs placeholder with {len(team_ids)} IDs")
         
         # Replace $DEPARTMENT_MEMBER_IDS
-        dept_ids = metadata.get('department_member_ids', [])
+        dept_ids = metadata.get('department_member_ids')
         if dept_ids:
             dept_ids_str = ", ".join([f"'{id}'" for id in dept_ids])
             patterns = [r'\$DEPARTMENT_MEMBER_IDS', r'\{DEPARTMENT_MEMBER_IDS\}']
@@ -308,31 +334,6 @@ class SQLSecurityValidator:
         
         return sql, modifications
     
-    def _strip_sql_comments(self, sql: str) -> str:
-        """
-        Strip SQL comments from the beginning of SQL statements.
-        Handles both single-line (--) and multi-line (/* */) comments.
-        """
-        sql = sql.strip()
-        
-        while sql:
-            # Skip single-line comments
-            if sql.startswith('--'):
-                newline_idx = sql.find('\n')
-                if newline_idx == -1:
-                    return ''  # Entire SQL is a comment
-                sql = sql[newline_idx + 1:].strip()
-            # Skip multi-line comments
-            elif sql.startswith('/*'):
-                end_idx = sql.find('*/')
-                if end_idx == -1:
-                    return ''  # Unclosed comment
-                sql = sql[end_idx + 2:].strip()
-            else:
-                break
-        
-        return sql
-    
     def _validate_operation_type(self, sql: str) -> Optional[str]:
         """
         Validate that the SQL operation type is allowed.
@@ -343,23 +344,21 @@ class SQLSecurityValidator:
         Returns:
             Error message if operation not allowed, None otherwise
         """
-        # Strip leading comments before checking operation type
-        sql_stripped = self._strip_sql_comments(sql)
-        sql_upper = sql_stripped.upper()
+        # Leading keyword only (comments skipped)
+        op = sql_operation(sql)
         
         # Check for dangerous operations first
-        for op in self.DANGEROUS_OPERATIONS:
-            if re.match(rf'^\s*{op}\b', sql_upper):
-                return f"Operation '{op}' is not allowed for security reasons"
+        if op in self.DANGEROUS_OPERATIONS:
+            return f"Operation '{op}' is not allowed for security reasons"
+        
+        if op == 'WITH':  # CTE is allowed (treated as SELECT)
+            return None
         
         # Check if operation is in allowed list
-        for op in ['SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH']:
-            if sql_upper.startswith(op):
-                if op == 'WITH':  # CTE is allowed (treated as SELECT)
-                    return None
-                if op not in self.allowed_operations:
-                    return f"Operation '{op}' is not allowed by configuration"
-                return None
+        if op in ('SELECT', 'INSERT', 'UPDATE', 'DELETE'):
+            if op not in self.allowed_operations:
+                return f"Operation '{op}' is not allowed by configuration"
+            return None
         
         return "Unknown or unsupported SQL operation type"
     
@@ -389,11 +388,10 @@ class SQLSecurityValidator:
         """
         warnings = []
         errors = []
-        sql_upper = sql.upper()
         
-        # Check for sensitive table access
-        for table in self.SENSITIVE_TABLES:
-            if re.search(rf'\b{table.upper()}\b', sql_upper):
+        # Check for sensitive table access (case-insensitive, no upper-cased copy)
+        for table, table_re in self._SENSITIVE_TABLE_RES:
+            if table_re.search(sql):
                 if role_level < RoleLevel.DEPARTMENT_MANAGER:
                     # Employees accessing sensitive tables need employee_id filter
                     if user_id and not self._has_user_filter(sql, user_id):
@@ -410,7 +408,7 @@ class SQLSecurityValidator:
                         )
         
         # Check for SELECT * without WHERE on large tables
-        if re.search(r'SELECT\s+\*\s+FROM', sql_upper) and 'WHERE' not in sql_upper:
+        if _SELECT_STAR_RE.search(sql) and not _WHERE_RE.search(sql):
             if role_level < RoleLevel.ADMIN:
                 warnings.append(
                     "Warning: Unfiltered SELECT * query - consider adding filters"
@@ -418,7 +416,7 @@ class SQLSecurityValidator:
         
         # Employees cannot UPDATE/DELETE without employee_id filter
         if role_level <= RoleLevel.EMPLOYEE:
-            if re.match(r'^\s*(UPDATE|DELETE)\b', sql_upper):
+            if sql_operation(sql) in ('UPDATE', 'DELETE'):
                 if user_id and not self._has_user_filter(sql, user_id):
                     errors.append(
                         f"Access denied: {self._get_operation_type(sql)} operations require "
@@ -496,8 +494,7 @@ class SQLSecurityValidator:
         
         # For SELECT queries without user filter, add a warning but don't modify
         # (modifying could break complex queries)
-        sql_upper = sql.strip().upper()
-        if sql_upper.startswith('SELECT'):
+        if sql_operation(sql) == 'SELECT':
             # Check if query targets user-specific tables
             user_tables = ['tr_leaves', 'tr_attendance', 'tr_expenses', 'performance_reviews']
             for table in user_tables:
@@ -512,10 +509,9 @@ class SQLSecurityValidator:
     
     def _get_operation_type(self, sql: str) -> str:
         """Extract operation type from SQL."""
-        sql_upper = sql.strip().upper()
-        for op in ['SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH']:
-            if sql_upper.startswith(op):
-                return op
+        op = sql_operation(sql)
+        if op in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH'):
+            return op
         return 'UNKNOWN'
 
 
@@ -2,27 +2,403 @@
 Vanna AI service for SQL generation from natural language
 Uses Vanna 2.0 Agent-based architecture with Qdrant vector database
 """
+import asyncio
+import functools
+import itertools
 import logging
+import operator
+import os
 import re
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime
 import time
 import asyncpg
 
 from vanna import Agent, ToolRegistry
 from vanna.integrations.openai import OpenAILlmService
-from vanna.integrations.qdrant import QdrantAgentMemory
 from vanna.tools import RunSqlTool
 from vanna.core.user.resolver import UserResolver
 from vanna.core.user.request_context import RequestContext
 from vanna.core.user.models import User
+from vanna.core.tool.models import ToolContext
 
 from ..config import settings
-from ..database import db_manager
-from .sql_validator import SQLSecurityValidator, ValidationResult
+from ..database import db_manager, PreparedConnection, rows_to_records, with_write_keyword
+from ..schemas import schema_loader
+from ..schemas.loader import LIBYAML_AVAILABLE
+from .sql_validator import SQLSecurityValidator, ValidationResult, sql_operation
+from .memory import TrainingAgentMemory
 
 logger = logging.getLogger(__name__)
 
+# Employee with role and department, plus the ids of active direct reports
+# (role level 3+) and active department members (role level 4+). The
+# subqueries only run when their CASE branch is taken.
+_SQL_RESOLVE_EMPLOYEE = """
+    WITH emp AS (
+        SELECT
+            e.id,
+            e.first_name,
+            e.last_name,
+            e.email,
+            e.position,
+            e.status,
+            e.department_id,
+            e.manager_id,
+            r.id as role_id,
+            r.name as role_name,
+            r.level as role_level,
+            d.name as department_name
+        FROM employees e
+        LEFT JOIN roles r ON e.role_id = r.id
+        LEFT JOIN departments d ON e.department_id = d.id
+        WHERE e.id = $1::uuid
+    )
+    SELECT
+        emp.*,
+        CASE WHEN COALESCE(emp.role_level, 0) >= 3 THEN ARRAY(
+            SELECT tm.id::text FROM employees tm
+            WHERE tm.manager_id = emp.id AND tm.status = 'active'
+        ) ELSE '{}'::text[] END AS team_member_ids,
+        CASE WHEN COALESCE(emp.role_level, 0) >= 4 AND emp.department_id IS NOT NULL THEN ARRAY(
+            SELECT dm.id::text FROM employees dm
+            WHERE dm.department_id = emp.department_id AND dm.status = 'active'
+        ) ELSE '{}'::text[] END AS department_member_ids
+    FROM emp
+"""
+
+# Canonical hyphenated UUID, as stored for employee ids
+_UUID_RE = re.compile(
+    r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$',
+    re.IGNORECASE
+)
+
+# Cumulative group memberships for role levels 0-5
+_GROUPS_BY_LEVEL = (
+    ('default', 'employee'),
+    ('default', 'employee', 'staff'),
+    ('default', 'employee', 'staff', 'supervisor'),
+    ('default', 'employee', 'staff', 'supervisor', 'manager'),
+    ('default', 'employee', 'staff', 'supervisor', 'manager', 'hr'),
+    ('default', 'employee', 'staff', 'supervisor', 'manager', 'hr', 'admin'),
+)
+
+# Conversation/request ids are internal only; a per-process counter is
+# unique enough and avoids an os.urandom call per id
+_ID_PREFIX = f"{os.getpid():x}"
+_ID_COUNTER = itertools.count()
+
+
+def _next_id(kind: str) -> str:
+    """Process-unique id such as 'req_1a2b_3f'"""
+    return f"{kind}_{_ID_PREFIX}_{next(_ID_COUNTER):x}"
+
+
+# What DatabaseUserResolver returns for the training_system id, built once
+# instead of being resolved for every training run
+_TRAINING_USER = User(
+    id='training_system',
+    username='training_system',
+    email='training_system@local',
+    metadata={'user_id': 'training_system', 'type': 'schema_training'},
+    group_memberships=['system', 'default']
+)
+
+
+async def _prepare_user_lookup(conn: PreparedConnection):
+    """
+    SQL runner pool init callback: prepare the resolve_user query once per
+    connection. Databases without the HRMS tables simply get no prepared
+    statement and resolve_user falls back to a plain query.
+    """
+    try:
+        conn.prepared = {"resolve_employee": await conn.prepare(_SQL_RESOLVE_EMPLOYEE)}
+    except asyncpg.PostgresError as e:
+        logger.debug(f"User lookup not prepared: {e}")
+        conn.prepared = {}
+
+
+# DATABASE_URL parts (see VannaSQLService._extract_* helpers)
+_URL_HOST_RE = re.compile(r'@([^:]+):')
+_URL_PORT_RE = re.compile(r':(\d+)/')
+_URL_DBNAME_RE = re.compile(r'/([^?]+)')
+_URL_USER_RE = re.compile(r'://([^:]+):')
+_URL_PASSWORD_RE = re.compile(r':([^@]+)@')
+
+# Leading keyword -> operation type (a CTE is a read unless it modifies
+# data, see VannaSQLService._get_operation_type)
+_OPERATION_TYPES = {
+    'SELECT': 'SELECT',
+    'WITH': 'SELECT',
+    'INSERT': 'INSERT',
+    'UPDATE': 'UPDATE',
+    'DELETE': 'DELETE',
+    'DROP': 'DROP',
+    'ALTER': 'ALTER',
+    'TRUNCATE': 'TRUNCATE',
+}
+
+# Statement keywords rejected unless listed in ALLOWED_OPERATIONS
+_DANGEROUS_KEYWORDS = frozenset({'DROP', 'TRUNCATE', 'ALTER'})
+
+# The same keywords anywhere in the SQL text. Deliberately independent of
+# the statement splitter, so a splitting bug cannot hide a DROP
+_DANGEROUS_KEYWORD_RE = re.compile(r'\b(DROP|TRUNCATE|ALTER)\b', re.IGNORECASE)
+
+# Tokens _split_sql_statements must see past (strings, quoted identifiers,
+# comments, dollar-quoted bodies) plus the statement separator. Unterminated
+# tokens run to the end of the SQL. As in Postgres (standard_conforming_strings
+# on), only E'...' strings treat backslash as an escape; elsewhere a quote is
+# escaped by doubling it.
+_STATEMENT_TOKEN_RE = re.compile(
+    r"""
+    (?<![A-Za-z0-9_$])[Ee]'(?:[^'\\]|\\.|'')*(?:'|\Z)
+    | '(?:[^']|'')*(?:'|\Z)
+    | "(?:[^"]|"")*(?:"|\Z)
+    | --[^\n]*
+    | /\*.*?(?:\*/|\Z)
+    | \$(?P<tag>[A-Za-z_][A-Za-z0-9_]*|)\$.*?(?:\$(?P=tag)\$|\Z)
+    | ;
+    """,
+    re.VERBOSE | re.DOTALL
+)
+
+# Leading whitespace and comments; an unterminated comment runs to the end
+_LEADING_COMMENTS_RE = re.compile(r'(?:\s*(?:--[^\n]*|/\*.*?(?:\*/|\Z)))*\s*', re.DOTALL)
+
+
+@functools.lru_cache(maxsize=1024)
+def _strip_leading_comments(sql: str) -> str:
+    """SQL with leading comments removed ('' if it is only comments)"""
+    return sql[_LEADING_COMMENTS_RE.match(sql).end():].strip()
+
+
+@functools.lru_cache(maxsize=256)
+def _split_statements(sql: str) -> Tuple[str, ...]:
+    """Statements of sql (see VannaSQLService._split_sql_statements)"""
+    statements = []
+    last = 0
+    for match in _STATEMENT_TOKEN_RE.finditer(sql):
+        if match.group() == ';':
+            statements.append(sql[last:match.start()])
+            last = match.end()
+    # Don't forget the last statement (may not have trailing semicolon)
+    statements.append(sql[last:])
+    
+    # Keep the original text (with comments) for context
+    return tuple(
+        stmt for stmt in (statement.strip() for statement in statements)
+        if stmt and _strip_leading_comments(stmt)
+    )
+
+
+# Cast following a string literal, e.g. the ::uuid in '...'::uuid
+_UUID_CAST_RE = re.compile(r'\s*::\s*uuid\b', re.IGNORECASE)
+_POSITIONAL_PARAM_RE = re.compile(r'\$\d')
+
+
+def _bind_user_id(sql: str, user_id: Optional[str]) -> Tuple[str, Tuple[Any, ...]]:
+    """
+    Replace '<user_id>'::uuid literals with $1 and return (sql, args).
+    
+    Generated SQL then has the same text for every user, so one cached
+    prepared statement (and plan) serves them all. Only cast literals are
+    bound: the cast fixes the parameter type, while a bare literal's type
+    depends on context Postgres may not resolve for a parameter. SQL that
+    already has positional parameters is returned unchanged.
+    """
+    literal = f"'{user_id}'" if user_id else None
+    if not literal or literal not in sql or _POSITIONAL_PARAM_RE.search(sql):
+        return sql, ()
+    
+    parts = []
+    last = 0
+    for match in _STATEMENT_TOKEN_RE.finditer(sql):
+        start = match.start()
+        # Skip prefixed literals (E'..', U&'..') and adjacent quoted strings
+        if (
+            match.group() == literal
+            and not (start and (sql[start - 1].isalnum() or sql[start - 1] in "_&'"))
+            and _UUID_CAST_RE.match(sql, match.end())
+        ):
+            parts.append(sql[last:start])
+            parts.append('$1')
+            last = match.end()
+    
+    if not parts:
+        return sql, ()
+    parts.append(sql[last:])
+    return ''.join(parts), (user_id,)
+
+
+# Static parts of the SQL generation prompt, built once at import
+_PROMPT_INTRO = """You are a SQL expert for an HRMS (Human Resource Management System) database. Generate a PostgreSQL query to answer the following question.
+
+"""
+
+_PROMPT_LEAVE_TABLE_RULES = """⚠️ CRITICAL TABLE NAMING RULES - READ FIRST ⚠️
+The following table names DO NOT EXIST and must NEVER be used:
+- ❌ leave_requests → ✅ Use 'tr_leaves' instead
+- ❌ leaves → ✅ Use 'tr_leaves' instead
+- ❌ leave_applications → ✅ Use 'tr_leaves' instead
+- ❌ time_off → ✅ Use 'tr_leaves' instead
+- ❌ pto_requests → ✅ Use 'tr_leaves' instead
+
+"""
+
+_PROMPT_TABLES = """CORRECT TABLE NAMES (use ONLY these):
+- tr_leaves: Leave requests and approvals (THE ONLY table for leave data)
+- employees: Employee master data
+- roles: Role definitions  
+- leave_types: Types of leaves (sick, vacation, etc.)
+- departments: Organization departments
+- permissions: Permission definitions
+- tr_role_permissions: Role-to-permission mappings
+
+The 'tr_' prefix indicates a TRANSACTION table.
+
+"""
+
+_PROMPT_MULTI_STATEMENT_RULES = """⚠️ CRITICAL RULES FOR MULTIPLE SQL STATEMENTS ⚠️
+If the question requires multiple queries (e.g., "show X and also Y"):
+1. Each SQL statement MUST be completely self-contained and independent
+2. DO NOT define a CTE (WITH clause) in one statement and reference it in another
+3. Each statement must include its own WITH clause if it needs a CTE
+4. Statements are executed separately - they cannot share CTEs or temporary tables
+
+Example of WRONG approach:
+```
+WITH data AS (SELECT ...) SELECT ... FROM data;  -- Statement 1 defines CTE
+SELECT ... FROM data;  -- Statement 2 FAILS - 'data' doesn't exist here!
+```
+
+Example of CORRECT approach:
+```
+WITH data AS (SELECT ...) SELECT ... FROM data;  -- Statement 1 with its own CTE
+WITH data AS (SELECT ...) SELECT ... FROM data;  -- Statement 2 with its own CTE (duplicated)
+```
+"""
+
+_PROMPT_HEADER = _PROMPT_INTRO + _PROMPT_LEAVE_TABLE_RULES + _PROMPT_TABLES + _PROMPT_MULTI_STATEMENT_RULES
+
+# Question keywords per intent bucket (same table families as
+# _generate_sample_questions). Leave questions and anything unclassified
+# get the full header; asset/document questions skip the leave-table
+# naming rules, which only matter for leave data.
+_LEAVE_KEYWORDS = ('leave', 'time off', 'pto', 'vacation', 'absence')
+_INTENT_KEYWORDS = (
+    ('leaves', _LEAVE_KEYWORDS),
+    ('assets', ('asset',)),
+    ('documents', ('document',)),
+)
+
+_PROMPT_HEADERS = {
+    'leaves': _PROMPT_HEADER,
+    'assets': _PROMPT_INTRO + _PROMPT_TABLES + _PROMPT_MULTI_STATEMENT_RULES,
+    'documents': _PROMPT_INTRO + _PROMPT_TABLES + _PROMPT_MULTI_STATEMENT_RULES,
+    'generic': _PROMPT_HEADER,
+}
+
+
+def _classify_intent(question: str) -> str:
+    """Intent bucket of a question, used to pick its prompt header"""
+    lowered = question.lower()
+    for intent, keywords in _INTENT_KEYWORDS:
+        if any(keyword in lowered for keyword in keywords):
+            return intent
+    return 'generic'
+
+
+# Per-user section of the prompt, filled with str.format_map
+_USER_CONTEXT_TEMPLATE = """
+Current User Context:
+- User ID (employee_id): {user_id}
+- Role: {role_name} (Level: {role_level})
+- Department: {department_name}
+- Is Manager: {is_manager}
+- Team Members: {team_count} direct reports
+
+When the question contains phrases like:
+- "my leaves", "my pending requests" → Filter by employee_id = '{user_id}'::uuid
+- "leaves I need to approve", "pending approvals" → Filter by e.manager_id = '{user_id}'::uuid AND status = 'pending'
+- "my team's leaves" → Filter by e.manager_id = '{user_id}'::uuid
+- "leaves I approved" → Filter by approved_by = '{user_id}'::uuid
+
+Replace $CURRENT_USER_ID placeholder with '{user_id}' in generated SQL.
+"""
+
+_PROMPT_FOOTER = """Generate ONLY the SQL query, no explanations. Use ONLY the exact table names listed above.
+If the question is user-specific (contains "my", "I"), apply appropriate WHERE filters based on the current user context.
+If generating multiple statements, ensure each is completely self-contained."""
+
+
+@dataclass
+class SQLGenerationContext:
+    """Everything the LLM phase needs; built without holding a DB connection"""
+    question: str
+    context: Optional[str]
+    role: Optional[str]
+    user_id: Optional[str]
+    request_context: RequestContext
+    user: User
+    prompt: str
+    context_item_count: int
+    start_time: float
+
+
+# Attribute paths that may hold a memory search result's text, in priority order
+_CONTENT_PATHS = ('memory.content', 'memory.text', 'content', 'text')
+_content_extractors: Dict[type, Callable[[Any], Optional[str]]] = {}
+
+
+def _extractor_for(item: Any) -> Callable[[Any], Optional[str]]:
+    """Pick the first attribute path present on item (decided once per type)"""
+    for path in _CONTENT_PATHS:
+        try:
+            operator.attrgetter(path)(item)
+        except AttributeError:
+            continue
+        return operator.attrgetter(path)
+    return lambda _item: None
+
+
+def _extract_content(item: Any) -> Optional[str]:
+    """Text of a memory search result (wrapped memory or bare item)"""
+    extractor = _content_extractors.get(type(item))
+    if extractor is None:
+        extractor = _content_extractors[type(item)] = _extractor_for(item)
+    return extractor(item)
+
+
+# Direct attributes tried when a component has no simple_component text
+_COMPONENT_TEXT_ATTRS = ('content', 'text', 'message', 'output', 'value')
+
+
+def _component_text(component: Any) -> Optional[str]:
+    """Text of a streamed agent component (almost always simple_component.text)"""
+    try:
+        text = component.simple_component.text
+    except AttributeError:
+        text = None
+    if text:
+        return text if isinstance(text, str) else str(text)
+    return _component_text_fallback(component)
+
+
+def _component_text_fallback(component: Any) -> Optional[str]:
+    """Slow path of _component_text: direct attributes only"""
+    for attr in _COMPONENT_TEXT_ATTRS:
+        val = getattr(component, attr, None)
+        if val and isinstance(val, (str, int, float)):
+            return val if isinstance(val, str) else str(val)
+    
+    # No model_dump() here: serializing the whole component tree costs far
+    # more than the text we are after, and simple_component was probed above
+    logger.debug("Unextractable component: %s", type(component).__name__)
+    return None
+
 
 class DatabaseUserResolver(UserResolver):
     """User resolver that fetches user details from HRMS database"""
@@ -30,17 +406,78 @@ class DatabaseUserResolver(UserResolver):
     # System user IDs that should not be looked up in database
     SYSTEM_USER_IDS = {'system', 'training_system', 'sql_generator', 'anonymous', ''}
     
-    def __init__(self, db_pool: asyncpg.Pool):
+    def __init__(
+        self,
+        db_pool: asyncpg.Pool,
+        cache_ttl: float = 300,
+        cache_size: int = 1024
+    ):
         self.db_pool = db_pool
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        # user_id -> (expires_at, employee row); HRMS data changes slowly
+        self._employee_cache: "OrderedDict[str, Tuple[float, asyncpg.Record]]" = OrderedDict()
+        self._employee_locks: Dict[str, asyncio.Lock] = {}
+    
+    def invalidate(self, user_id: Optional[str] = None):
+        """Drop cached employee data for one user, or for all users"""
+        if user_id is None:
+            self._employee_cache.clear()
+        else:
+            self._employee_cache.pop(user_id, None)
+    
+    def _cached_employee(self, user_id: str) -> Optional[asyncpg.Record]:
+        """Return a fresh cached employee row, or None"""
+        entry = self._employee_cache.get(user_id)
+        if entry and entry[0] > time.monotonic():
+            self._employee_cache.move_to_end(user_id)
+            return entry[1]
+        return None
+    
+    async def _get_employee(self, user_id: str) -> Optional[asyncpg.Record]:
+        """
+        Load the employee row (with team/department member ids) for user_id.
+        
+        Rows are cached for cache_ttl seconds; a per-user lock makes
+        concurrent misses share one DB round trip. Unknown users are not
+        cached.
+        """
+        employee = self._cached_employee(user_id)
+        if employee is not None:
+            return employee
+        
+        lock = self._employee_locks.setdefault(user_id, asyncio.Lock())
+        try:
+            async with lock:
+                # Another waiter may have filled the entry while we were queued
+                employee = self._cached_employee(user_id)
+                if employee is not None:
+                    return employee
+                
+                async with self.db_pool.acquire() as conn:
+                    # Employee, role, team and department members in one round trip
+                    stmt = getattr(conn, 'prepared', {}).get('resolve_employee')
+                    if stmt is not None:
+                        employee = await stmt.fetchrow(user_id)
+                    else:
+                        employee = await conn.fetchrow(_SQL_RESOLVE_EMPLOYEE, user_id)
+                
+                if employee is not None:
+                    self._employee_cache[user_id] = (time.monotonic() + self.cache_ttl, employee)
+                    self._employee_cache.move_to_end(user_id)
+                    while len(self._employee_cache) > self.cache_size:
+                        self._employee_cache.popitem(last=False)
+                return employee
+        finally:
+            # Locks only live while a load is in flight, so unknown or
+            # invalid ids cannot grow the dict. Waiters already queued keep
+            # their reference; later callers find the cache filled.
+            if self._employee_locks.get(user_id) is lock:
+                del self._employee_locks[user_id]
     
     def _is_valid_uuid(self, value: str) -> bool:
         """Check if a string is a valid UUID"""
-        import re
-        uuid_pattern = re.compile(
-            r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$',
-            re.IGNORECASE
-        )
-        return bool(uuid_pattern.match(value))
+        return bool(_UUID_RE.match(value))
     
     async def resolve_user(self, request_context: RequestContext) -> User:
         """
@@ -65,91 +502,50 @@ class DatabaseUserResolver(UserResolver):
             )
         
         try:
-            async with self.db_pool.acquire() as conn:
-                # Fetch employee with role from database
-                employee = await conn.fetchrow("""
-                    SELECT 
-                        e.id,
-                        e.first_name,
-                        e.last_name,
-                        e.email,
-                        e.position,
-                        e.status,
-                        e.department_id,
-                        e.manager_id,
-                        r.id as role_id,
-                        r.name as role_name,
-                        r.level as role_level,
-                        d.name as department_name
-                    FROM employees e
-                    LEFT JOIN roles r ON e.role_id = r.id
-                    LEFT JOIN departments d ON e.department_id = d.id
-                    WHERE e.id = $1::uuid
-                """, user_id)
+            employee = await self._get_employee(user_id)
+            if employee:
+                # Determine group memberships based on role
+                role_name = role_override or employee['role_name'] or 'employee'
+                role_level = employee['role_level'] or 0
                 
-                if employee:
-                    # Determine group memberships based on role
-                    role_name = role_override or employee['role_name'] or 'employee'
-                    role_level = employee['role_level'] or 0
-                    
-                    # Build group memberships based on role level
-                    group_memberships = ['default', 'employee']
-                    if role_level >= 1:
-                        group_memberships.append('staff')
-                    if role_level >= 2:
-                        group_memberships.append('supervisor')
-                    if role_level >= 3:
-                        group_memberships.append('manager')
-                    if role_level >= 4:
-                        group_memberships.append('hr')
-                    if role_level >= 5:
-                        group_memberships.append('admin')
-                    
-                    # Add role name to groups
+                # Group memberships based on role level, plus the role name
+                group_memberships = list(_GROUPS_BY_LEVEL[min(max(role_level, 0), 5)])
+                if role_name.lower() not in group_memberships:
                     group_memberships.append(role_name.lower())
-                    
-                    # Fetch team members if user is a manager (has direct reports)
-                    team_member_ids = []
-                    if role_level >= 3:  # Manager level or above
-                        team_members = await conn.fetch("""
-                            SELECT id FROM employees 
-                            WHERE manager_id = $1::uuid AND status = 'active'
-                        """, user_id)
-                        team_member_ids = [str(tm['id']) for tm in team_members]
-                    
-                    # Fetch all employees in same department if HR or Admin
-                    department_member_ids = []
-                    if role_level >= 4 and employee['department_id']:  # HR level or above
-                        dept_members = await conn.fetch("""
-                            SELECT id FROM employees 
-                            WHERE department_id = $1 AND status = 'active'
-                        """, employee['department_id'])
-                        department_member_ids = [str(dm['id']) for dm in dept_members]
-                    
-                    return User(
-                        id=str(employee['id']),
-                        username=f"{employee['first_name']} {employee['last_name']}",
-                        email=employee['email'] or f"{user_id}@local",
-                        metadata={
-                            **metadata,
-                            'employee_id': str(employee['id']),
-                            'department_id': str(employee['department_id']) if employee['department_id'] else None,
-                            'department_name': employee['department_name'],
-                            'manager_id': str(employee['manager_id']) if employee['manager_id'] else None,
-                            'role_id': employee['role_id'],
-                            'role_name': role_name,
-                            'role_level': role_level,
-                            'position': employee['position'],
-                            'status': employee['status'],
-                            'team_member_ids': team_member_ids,  # Direct reports (for managers)
-                            'department_member_ids': department_member_ids,  # Department members (for HR)
-                            'is_manager': len(team_member_ids) > 0,
-                            'is_hr': role_level >= 4
-                        },
-                        group_memberships=list(set(group_memberships))
-                    )
-                else:
-                    logger.warning(f"Employee not found for user_id: {user_id}")
+                
+                # Direct reports (managers, level 3+) and department
+                # members (HR, level 4+); empty below those levels
+                team_member_ids = list(employee['team_member_ids'])
+                department_member_ids = list(employee['department_member_ids'])
+                
+                # Caller metadata copied once, then extended in place
+                employee_id = str(employee['id'])
+                user_metadata = metadata.copy()
+                user_metadata.update(
+                    employee_id=employee_id,
+                    department_id=str(employee['department_id']) if employee['department_id'] else None,
+                    department_name=employee['department_name'],
+                    manager_id=str(employee['manager_id']) if employee['manager_id'] else None,
+                    role_id=employee['role_id'],
+                    role_name=role_name,
+                    role_level=role_level,
+                    position=employee['position'],
+                    status=employee['status'],
+                    team_member_ids=team_member_ids,  # Direct reports (for managers)
+                    department_member_ids=department_member_ids,  # Department members (for HR)
+                    is_manager=len(team_member_ids) > 0,
+                    is_hr=role_level >= 4
+                )
+                
+                return User(
+                    id=employee_id,
+                    username=f"{employee['first_name']} {employee['last_name']}",
+                    email=employee['email'] or f"{user_id}@local",
+                    metadata=user_metadata,
+                    group_memberships=group_memberships
+                )
+            else:
+                logger.warning(f"Employee not found for user_id: {user_id}")
         
         except Exception as e:
             logger.error(f"Error resolving user from database: {e}")
@@ -172,9 +568,26 @@ class PostgresSQLRunner:
         self.pool: Optional[asyncpg.Pool] = None
     
     async def initialize(self):
-        """Initialize connection pool"""
+        """
+        Initialize connection pool
+        
+        This pool also serves DatabaseUserResolver, so each connection
+        prepares the user lookup when it is opened. It is sized separately
+        from db_manager's pool so agent SQL cannot starve direct queries.
+        """
         if not self.pool:
-            self.pool = await asyncpg.create_pool(self.connection_string)
+            self.pool = await asyncpg.create_pool(
+                self.connection_string,
+                min_size=settings.SQL_RUNNER_MIN_POOL_SIZE,
+                max_size=settings.SQL_RUNNER_MAX_POOL_SIZE,
+                timeout=settings.DB_TIMEOUT,
+                command_timeout=settings.QUERY_TIMEOUT,
+                statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+                max_cached_statement_lifetime=settings.DB_MAX_CACHED_STATEMENT_LIFETIME,
+                max_inactive_connection_lifetime=settings.DB_MAX_INACTIVE_CONNECTION_LIFETIME,
+                connection_class=PreparedConnection,
+                init=_prepare_user_lookup
+            )
     
     async def run_sql(self, sql: str) -> List[Dict[str, Any]]:
         """Execute SQL and return results"""
@@ -198,10 +611,11 @@ class VannaSQLService:
         self.agent: Optional[Agent] = None
         self.tool_registry: Optional[ToolRegistry] = None
         self.sql_runner: Optional[PostgresSQLRunner] = None
-        self.memory: Optional[QdrantAgentMemory] = None
+        self.memory: Optional[TrainingAgentMemory] = None
         self.user_resolver = None  # Store user resolver for training
         self.initialized = False
         self.trained_tables = set()
+        self._duplicate_memories_removed = False
         self.security_validator = SQLSecurityValidator(settings)  # SQL security validator
     
     async def initialize(self):
@@ -215,6 +629,9 @@ class VannaSQLService:
             
             logger.info(f"Using OpenAI model: {settings.OPENAI_MODEL}")
             
+            if not LIBYAML_AVAILABLE:
+                logger.warning("⚠️ PyYAML built without libyaml; schema configs use the slower pure-Python parser")
+            
             # Initialize OpenAI LLM Service
             llm_service = OpenAILlmService(
                 api_key=settings.OPENAI_API_KEY,
@@ -222,7 +639,7 @@ class VannaSQLService:
             )
             
             # Initialize Qdrant Agent Memory
-            self.memory = QdrantAgentMemory(
+            self.memory = TrainingAgentMemory(
                 url=settings.QDRANT_URL,
                 collection_name=settings.QDRANT_COLLECTION,
                 api_key=settings.QDRANT_API_KEY
@@ -241,7 +658,11 @@ class VannaSQLService:
             self.tool_registry.register_local_tool(sql_tool, access_groups=[])
             
             # Create database-backed user resolver (fetches from employees and roles tables)
-            self.user_resolver = DatabaseUserResolver(self.sql_runner.pool)
+            self.user_resolver = DatabaseUserResolver(
+                self.sql_runner.pool,
+                cache_ttl=settings.USER_CACHE_TTL,
+                cache_size=settings.USER_CACHE_MAX_SIZE
+            )
             
             # Create Agent with correct parameters
             self.agent = Agent(
@@ -256,7 +677,7 @@ class VannaSQLService:
             
             # Train with schema from YAML config (replaces hardcoded training)
             await self.train_on_schema_config(settings.SCHEMA_NAME)
-            
+        
         except Exception as e:
             logger.error(f"❌ Failed to initialize Vanna Agent: {e}")
             raise
@@ -277,141 +698,121 @@ class VannaSQLService:
         
         Args:
             schema_name: Name of schema config file (without .yaml extension)
-            
+        
         Returns:
             Dict with training results
         """
         try:
             logger.info(f"📚 Training Vanna Agent on schema config: {schema_name}")
             
-            # Import required classes
-            from vanna.core.tool.models import ToolContext
-            from ..schemas import SchemaConfigLoader
-            import uuid
+            # Load YAML configuration (cached until the file changes)
             
-            # Load YAML configuration
-            loader = SchemaConfigLoader()
-            
-            if not loader.schema_exists(schema_name):
-                logger.warning(f"Schema config '{schema_name}' not found. Available: {loader.list_schemas()}")
+            if not schema_loader.schema_exists(schema_name):
+                logger.warning(f"Schema config '{schema_name}' not found. Available: {schema_loader.list_schemas()}")
                 return {
                     "success": False,
                     "error": f"Schema config '{schema_name}' not found",
-                    "available_schemas": loader.list_schemas()
+                    "available_schemas": schema_loader.list_schemas()
                 }
             
-            config = loader.load(schema_name)
+            config = schema_loader.load(schema_name)
             logger.info(f"📖 Loaded schema config: {config.schema_info.name} v{config.schema_info.version}")
             
-            # Create context for training
-            request_context = RequestContext(
-                metadata={"user_id": "training_system", "type": "schema_training"}
-            )
-            user = await self.user_resolver.resolve_user(request_context)
+            # One resolved user and ToolContext for the whole run
+            tool_context = self._training_tool_context(schema_name)
             
             trained_count = 0
             trained_tables = []
             trained_examples = []
             errors = []
             
-            # 1. Train on tables (hybrid: YAML config + database introspection)
+            # 1. Train on tables (hybrid: YAML config + database introspection).
+            # Discovered DDL is fetched in one query and saved in batched upserts.
+            table_cfgs = []
             for table_cfg in config.tables:
-                if not table_cfg.include_in_training:
-                    logger.debug(f"  ⏭️ Skipping table: {table_cfg.name} (include_in_training=false)")
-                    continue
-                    
-                try:
-                    # Get DDL from database or use override
-                    if table_cfg.discovery:
-                        ddl = await db_manager.get_table_ddl(table_cfg.name)
-                        logger.debug(f"  📊 Auto-discovered DDL for: {table_cfg.name}")
-                    else:
-                        ddl = table_cfg.ddl_override or f"-- No DDL for {table_cfg.name}"
-                        logger.debug(f"  📝 Using manual DDL for: {table_cfg.name}")
-                    
-                    # Enhance DDL with notes from YAML config
-                    if table_cfg.notes:
-                        ddl += f"\n-- Notes:\n-- {table_cfg.notes.replace(chr(10), chr(10) + '-- ')}"
-                    
+                if table_cfg.include_in_training:
+                    table_cfgs.append(table_cfg)
+                else:
+                    logger.debug("  ⏭️ Skipping table: %s (include_in_training=false)", table_cfg.name)
+            
+            discovery_names = [table_cfg.name for table_cfg in table_cfgs if table_cfg.discovery]
+            discovered = dict(zip(discovery_names, await self._fetch_ddls(discovery_names)))
+            
+            ddl_tables = []
+            ddl_contents = []
+            for table_cfg in table_cfgs:
+                # Get DDL from database or use override
+                if table_cfg.discovery:
+                    ddl = discovered[table_cfg.name]
+                    logger.debug("  📊 Auto-discovered DDL for: %s", table_cfg.name)
+                else:
+                    ddl = table_cfg.ddl_override or f"-- No DDL for {table_cfg.name}"
+                    logger.debug("  📝 Using manual DDL for: %s", table_cfg.name)
+                
+                # Enhance DDL with description and notes from YAML config,
+                # joined once instead of concatenated piecewise
+                if table_cfg.description or table_cfg.notes:
+                    parts = []
                     if table_cfg.description:
-                        ddl = f"-- {table_cfg.description}\n{ddl}"
-                    
-                    # Save DDL to memory
-                    tool_context = ToolContext(
-                        user=user,
-                        conversation_id=f"training_{uuid.uuid4().hex[:8]}",
-                        request_id=f"req_{uuid.uuid4().hex[:8]}",
-                        agent_memory=self.memory,
-                        metadata={"type": "ddl", "table": table_cfg.name}
-                    )
-                    
-                    await self.memory.save_text_memory(
-                        content=ddl,
-                        context=tool_context
-                    )
-                    trained_count += 1
-                    trained_tables.append(table_cfg.name)
-                    self.trained_tables.add(table_cfg.name)
-                    logger.info(f"  ✓ Trained DDL: {table_cfg.name}")
-                    
-                except Exception as e:
-                    error_msg = f"Failed to train table {table_cfg.name}: {e}"
+                        parts.append(f"-- {table_cfg.description}")
+                    parts.append(ddl)
+                    if table_cfg.notes:
+                        parts.append("-- Notes:")
+                        parts.append("-- " + table_cfg.notes.replace("\n", "\n-- "))
+                    ddl = "\n".join(parts)
+                
+                ddl_tables.append(table_cfg.name)
+                ddl_contents.append(ddl)
+            
+            # Save DDL to memory
+            tool_context.metadata = {"type": "ddl"}
+            failures = await self._save_text_memories(ddl_contents, tool_context)
+            for table_name, failure in zip(ddl_tables, failures):
+                if failure:
+                    error_msg = f"Failed to train table {table_name}: {failure}"
                     logger.warning(f"  ✗ {error_msg}")
                     errors.append(error_msg)
-            
-            # 2. Train on example queries from YAML
-            for example in config.examples:
-                try:
-                    content = f"Question: {example.question}\nSQL: {example.sql}"
-                    
-                    tool_context = ToolContext(
-                        user=user,
-                        conversation_id=f"training_{uuid.uuid4().hex[:8]}",
-                        request_id=f"req_{uuid.uuid4().hex[:8]}",
-                        agent_memory=self.memory,
-                        metadata={
-                            "type": "example",
-                            "category": example.category or "general"
-                        }
-                    )
-                    
-                    await self.memory.save_text_memory(
-                        content=content,
-                        context=tool_context
-                    )
+                else:
                     trained_count += 1
-                    trained_examples.append(example.question)
-                    logger.debug(f"  ✓ Trained example: {example.question[:50]}...")
-                    
-                except Exception as e:
-                    error_msg = f"Failed to train example '{example.question[:30]}...': {e}"
-                    logger.warning(f"  ✗ {error_msg}")
-                    errors.append(error_msg)
+                    trained_tables.append(table_name)
+                    self.trained_tables.add(table_name)
+                    logger.info("  ✓ Trained DDL: %s", table_name)
+            
+            # 2. Train on example queries from YAML (content-hash point ids
+            # make saving examples that are already stored a no-op)
+            if config.examples:
+                tool_context.metadata = {"type": "example"}
+                failures = await self._save_text_memories(
+                    [f"Question: {example.question}\nSQL: {example.sql}" for example in config.examples],
+                    tool_context
+                )
+                
+                for example, failure in zip(config.examples, failures):
+                    if failure:
+                        error_msg = f"Failed to train example '{example.question[:30]}...': {failure}"
+                        logger.warning(f"  ✗ {error_msg}")
+                        errors.append(error_msg)
+                    else:
+                        trained_count += 1
+                        trained_examples.append(example.question)
+                        logger.debug("  ✓ Trained example: %.50s...", example.question)
             
             # 3. Train on documentation from YAML
-            for doc in config.documentation:
-                try:
-                    content = f"Topic: {doc.topic}\n\n{doc.content}"
-                    
-                    tool_context = ToolContext(
-                        user=user,
-                        conversation_id=f"training_{uuid.uuid4().hex[:8]}",
-                        request_id=f"req_{uuid.uuid4().hex[:8]}",
-                        agent_memory=self.memory,
-                        metadata={"type": "documentation", "topic": doc.topic}
-                    )
-                    
-                    await self.memory.save_text_memory(
-                        content=content,
-                        context=tool_context
-                    )
-                    trained_count += 1
-                    logger.debug(f"  ✓ Trained doc: {doc.topic}")
-                    
-                except Exception as e:
-                    error_msg = f"Failed to train doc '{doc.topic}': {e}"
-                    logger.warning(f"  ✗ {error_msg}")
-                    errors.append(error_msg)
+            if config.documentation:
+                tool_context.metadata = {"type": "documentation"}
+                failures = await self._save_text_memories(
+                    [f"Topic: {doc.topic}\n\n{doc.content}" for doc in config.documentation],
+                    tool_context
+                )
+                
+                for doc, failure in zip(config.documentation, failures):
+                    if failure:
+                        error_msg = f"Failed to train doc '{doc.topic}': {failure}"
+                        logger.warning(f"  ✗ {error_msg}")
+                        errors.append(error_msg)
+                    else:
+                        trained_count += 1
+                        logger.debug("  ✓ Trained doc: %s", doc.topic)
             
             # 4. Train on relationships as documentation
             if config.relationships:
@@ -421,23 +822,15 @@ class VannaSQLService:
                     if rel.description:
                         relationships_doc += f" ({rel.description})"
                 
-                try:
-                    tool_context = ToolContext(
-                        user=user,
-                        conversation_id=f"training_{uuid.uuid4().hex[:8]}",
-                        request_id=f"req_{uuid.uuid4().hex[:8]}",
-                        agent_memory=self.memory,
-                        metadata={"type": "documentation", "topic": "relationships"}
-                    )
-                    
-                    await self.memory.save_text_memory(
-                        content=relationships_doc,
-                        context=tool_context
-                    )
+                tool_context.metadata = {"type": "documentation", "topic": "relationships"}
+                failure, = await self._save_text_memories([relationships_doc], tool_context)
+                if failure:
+                    logger.warning(f"  ✗ Failed to train relationships: {failure}")
+                else:
                     trained_count += 1
                     logger.debug(f"  ✓ Trained relationships ({len(config.relationships)} relations)")
-                except Exception as e:
-                    logger.warning(f"  ✗ Failed to train relationships: {e}")
+            
+            await self._remove_duplicate_memories()
             
             logger.info(
                 f"✅ Schema training complete: {len(trained_tables)} tables, "
@@ -453,18 +846,75 @@ class VannaSQLService:
                 "examples_trained": len(trained_examples),
                 "errors": errors if errors else None
             }
-            
+        
         except FileNotFoundError as e:
             logger.error(f"❌ Schema config file not found: {e}")
             return {"success": False, "error": str(e)}
         except Exception as e:
             logger.error(f"❌ Schema training failed: {e}")
             return {"success": False, "error": str(e)}
-
+    
+    def _training_tool_context(self, schema_name: Optional[str] = None) -> ToolContext:
+        """
+        Build the ToolContext shared by every item of one training run.
+        
+        Callers set context.metadata per item before saving.
+        """
+        return ToolContext(
+            user=_TRAINING_USER,
+            conversation_id=_next_id("training"),
+            request_id=_next_id("req"),
+            agent_memory=self.memory,
+            metadata={"schema": schema_name or "default"}
+        )
+    
+    async def _fetch_ddls(self, table_names: List[str]) -> List[str]:
+        """
+        Fetch DDL for many tables over one pooled connection.
+        
+        Each distinct table is introspected once even if named repeatedly,
+        and cached DDL is reused without a query.
+        
+        Returns:
+            One DDL string (or placeholder comment) per table
+        """
+        ddls = await db_manager.get_tables_ddl_bulk(list(dict.fromkeys(table_names)))
+        return [ddls[name] for name in table_names]
+    
+    async def _save_text_memories(
+        self,
+        contents: List[str],
+        tool_context: ToolContext
+    ) -> List[Optional[str]]:
+        """
+        Save many text memories in batches of TRAINING_BATCH_SIZE
+        (see TrainingAgentMemory.save_text_memories_batch).
+        
+        Returns:
+            One entry per content: None on success, otherwise the error message
+        """
+        return await self.memory.save_text_memories_batch(
+            contents, tool_context, batch_size=settings.TRAINING_BATCH_SIZE
+        )
+    
+    async def _remove_duplicate_memories(self):
+        """
+        Once per process, after training saved its content-hash points, drop
+        copies of the same memories stored earlier under random ids
+        """
+        if self._duplicate_memories_removed:
+            return
+        try:
+            await self.memory.remove_duplicate_text_memories()
+            self._duplicate_memories_removed = True
+        except Exception as e:
+            logger.warning(f"Could not remove duplicate memories: {e}")
+    
     async def train_on_database_schema(
         self, 
         tables: Optional[List[str]] = None,
-        schema_name: Optional[str] = None
+        schema_name: Optional[str] = None,
+        progress: Optional[Callable[[str, int], None]] = None
     ) -> Dict[str, Any]:
         """
         Train Vanna Agent on database schema using memory
@@ -474,106 +924,65 @@ class VannaSQLService:
         Args:
             tables: Specific tables to train on (if None, trains on all)
             schema_name: Context name for training (e.g., 'leaves', 'assets')
+            progress: Called with (table_name, total_tables) after each table is trained
         """
         try:
             logger.info(f"📚 Training Vanna Agent on database schema...")
             
-            # Get tables to train on
+            # Get tables to train on (duplicates would be embedded twice)
             if not tables:
                 tables = await db_manager.get_all_tables()
+            else:
+                tables = list(dict.fromkeys(tables))
             
             trained = []
             sample_questions = []
             
-            # Import required classes for ToolContext
-            from vanna.core.tool.models import ToolContext
-            from vanna.core.user.request_context import RequestContext
-            import uuid
+            # One resolved user and ToolContext for the whole run
+            context = self._training_tool_context(schema_name)
             
-            for table_name in tables:
-                try:
-                    # Get DDL
-                    ddl = await db_manager.get_table_ddl(table_name)
-                    
-                    # Create a proper ToolContext with all required fields
-                    # We need: user, conversation_id, request_id, agent_memory
-                    request_context = RequestContext(
-                        metadata={
-                            "user_id": "training_system",
-                            "type": "ddl",
-                            "table": table_name,
-                            "schema": schema_name or "default"
-                        }
-                    )
-                    
-                    # Resolve user using our resolver
-                    user = await self.user_resolver.resolve_user(request_context)
-                    
-                    # Create ToolContext with all required fields
-                    context = ToolContext(
-                        user=user,
-                        conversation_id=f"training_{uuid.uuid4().hex[:8]}",
-                        request_id=f"req_{uuid.uuid4().hex[:8]}",
-                        agent_memory=self.memory,
-                        metadata={
-                            "type": "ddl",
-                            "table": table_name,
-                            "schema": schema_name or "default"
-                        }
-                    )
-                    
-                    # Store DDL in memory (async operation)
-                    await self.memory.save_text_memory(
-                        content=ddl,
-                        context=context
-                    )
+            # Tables are handled in chunks: DDL fetched in one query, then
+            # DDL and sample questions saved with batched upserts
+            batch_size = settings.TRAINING_BATCH_SIZE
+            for start in range(0, len(tables), batch_size):
+                chunk = tables[start:start + batch_size]
+                
+                ready = list(zip(chunk, await self._fetch_ddls(chunk)))
+                
+                # Store DDL in memory
+                context.metadata = {"type": "ddl", "schema": schema_name or "default"}
+                failures = await self._save_text_memories([ddl for _, ddl in ready], context)
+                
+                examples = []
+                for (table_name, _), failure in zip(ready, failures):
+                    if failure:
+                        logger.warning(f"Failed to train on table {table_name}: {failure}")
+                        continue
                     
                     trained.append(table_name)
                     self.trained_tables.add(table_name)
+                    if progress:
+                        progress(table_name, len(tables))
                     
-                    logger.info(f"  ✓ Trained on table: {table_name}")
+                    logger.info("  ✓ Trained on table: %s", table_name)
                     
                     # Add sample questions for common tables
-                    questions = self._generate_sample_questions(table_name, schema_name)
-                    for question, sql in questions:
-                        try:
-                            # Create context for example
-                            example_request_context = RequestContext(
-                                metadata={
-                                    "user_id": "training_system",
-                                    "type": "example",
-                                    "table": table_name,
-                                    "question": question,
-                                    "sql": sql
-                                }
-                            )
-                            
-                            example_user = await self.user_resolver.resolve_user(example_request_context)
-                            
-                            example_context = ToolContext(
-                                user=example_user,
-                                conversation_id=f"training_{uuid.uuid4().hex[:8]}",
-                                request_id=f"req_{uuid.uuid4().hex[:8]}",
-                                agent_memory=self.memory,
-                                metadata={
-                                    "type": "example",
-                                    "table": table_name,
-                                    "question": question,
-                                    "sql": sql
-                                }
-                            )
-                            
-                            await self.memory.save_text_memory(
-                                content=f"Question: {question}\nSQL: {sql}",
-                                context=example_context
-                            )
+                    for question, sql in self._generate_sample_questions(table_name, schema_name):
+                        examples.append((table_name, question, sql))
+                
+                if examples:
+                    context.metadata = {"type": "example", "schema": schema_name or "default"}
+                    failures = await self._save_text_memories(
+                        [f"Question: {question}\nSQL: {sql}" for _, question, sql in examples],
+                        context
+                    )
+                    for (table_name, question, _), failure in zip(examples, failures):
+                        if failure:
+                            logger.warning(f"Failed to train question for {table_name}: {failure}")
+                        else:
                             sample_questions.append(question)
-                        except Exception as e:
-                            logger.warning(f"Failed to train question for {table_name}: {e}")
-                    
-                except Exception as e:
-                    logger.warning(f"Failed to train on table {table_name}: {e}")
-                    continue
+            
+            await self._remove_duplicate_memories()
             
             logger.info(f"✅ Training complete. Trained on {len(trained)} tables")
             
@@ -582,7 +991,7 @@ class VannaSQLService:
                 "tables_trained": trained,
                 "sample_questions": sample_questions
             }
-            
+        
         except Exception as e:
             logger.error(f"❌ Training failed: {e}")
             return {
@@ -614,206 +1023,182 @@ class VannaSQLService:
             }
         
         try:
-            start_time = time.time()
-            
-            logger.info(f"🔍 Generating SQL for: {question} (user: {user_id}, role: {role})")
-            
-            # Import required classes for ToolContext
-            from vanna.core.user.request_context import RequestContext
-            from vanna.core.tool.models import ToolContext
-            import uuid
-            
-            # Create request context for user resolution with actual user_id
-            request_context = RequestContext(
-                metadata={
-                    "user_id": user_id or "sql_generator",
-                    "context": context, 
-                    "role": role
-                }
-            )
-            
-            # Resolve user to get full context (team members, department, etc.)
-            user = await self.user_resolver.resolve_user(request_context)
-            
-            # Create ToolContext for memory search
-            tool_context = ToolContext(
-                user=user,
-                conversation_id=f"query_{uuid.uuid4().hex[:8]}",
-                request_id=f"req_{uuid.uuid4().hex[:8]}",
-                agent_memory=self.memory,
-                metadata={"context": context, "role": role}
-            )
-            
-            # Retrieve relevant context from memory with proper ToolContext
-            relevant_context = await self.memory.search_text_memories(
+            generation_context = await self.prepare_context(question, context, role, user_id)
+        except Exception as e:
+            logger.error(f"❌ SQL generation failed: {e}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+        
+        return await self.generate_sql_from_context(generation_context)
+    
+    async def prepare_context(
+        self,
+        question: str,
+        context: Optional[str] = None,
+        role: Optional[str] = None,
+        user_id: Optional[str] = None,
+        similar_example: Optional[Tuple[str, str]] = None
+    ) -> SQLGenerationContext:
+        """
+        Phase 1 of generation: resolve the user and retrieve memory context.
+        
+        Database access here is a short acquire/release inside the user
+        resolver, so no pool connection is held during the LLM call that
+        follows (see generate_sql_from_context).
+        
+        Args:
+            similar_example: (question, sql) of a similar earlier request,
+                added to the context as a worked example
+        
+        Raises:
+            Exception: If user resolution or memory search fails
+        """
+        start_time = time.time()
+        
+        logger.info(f"🔍 Generating SQL for: {question} (user: {user_id}, role: {role})")
+        
+        # Create request context for user resolution with actual user_id
+        request_context = RequestContext(
+            metadata={
+                "user_id": user_id or "sql_generator",
+                "context": context, 
+                "role": role
+            }
+        )
+        
+        # ToolContext for memory search. The Qdrant memory only embeds the
+        # question and does not scope results by caller, so the search can
+        # use the requested id instead of waiting for the resolved user
+        tool_context = ToolContext(
+            user=User(id=request_context.metadata["user_id"], metadata=request_context.metadata),
+            conversation_id=_next_id("query"),
+            request_id=_next_id("req"),
+            agent_memory=self.memory,
+            metadata={"context": context, "role": role}
+        )
+        
+        # Resolve the user (team members, department, etc.) while the
+        # question is embedded and searched, rather than one after the other
+        user, relevant_context = await asyncio.gather(
+            self.user_resolver.resolve_user(request_context),
+            self.memory.search_text_memories(
                 query=question,
                 context=tool_context,
                 limit=5
             )
-            
-            logger.info(f"📚 Retrieved {len(relevant_context)} context items from memory")
-            
-            # Build prompt with context - extract content from memory objects
-            context_items = []
-            for idx, item in enumerate(relevant_context):
-                # Try to extract content from the memory search result
-                content = None
-                if hasattr(item, 'memory'):
-                    memory = item.memory
-                    if hasattr(memory, 'content'):
-                        content = memory.content
-                    elif hasattr(memory, 'text'):
-                        content = memory.text
-                elif hasattr(item, 'content'):
-                    content = item.content
-                elif hasattr(item, 'text'):
-                    content = item.text
-                
-                if content:
-                    context_items.append(f"Reference {idx+1}:\n{content}")
-                    logger.debug(f"Context item {idx+1}: {content[:100]}...")
-                else:
-                    logger.warning(f"Could not extract content from item {idx+1}: {type(item).__name__}")
-            
-            context_str = "\n\n".join(context_items)
-            
-            logger.info(f"Context string length: {len(context_str)} chars")
-            logger.debug(f"Context preview: {context_str[:500]}..." if len(context_str) > 500 else f"Context: {context_str}")
-            
-            # Build user context information for personalized queries
-            user_context_info = ""
-            if user and user.id not in self.user_resolver.SYSTEM_USER_IDS:
-                user_info = user.metadata
-                user_context_info = f"""
-Current User Context:
-- User ID (employee_id): {user.id}
-- Role: {user_info.get('role_name', 'employee')} (Level: {user_info.get('role_level', 0)})
-- Department: {user_info.get('department_name', 'Unknown')}
-- Is Manager: {user_info.get('is_manager', False)}
-- Team Members: {len(user_info.get('team_member_ids', []))} direct reports
-
-When the question contains phrases like:
-- "my leaves", "my pending requests" → Filter by employee_id = '{user.id}'::uuid
-- "leaves I need to approve", "pending approvals" → Filter by e.manager_id = '{user.id}'::uuid AND status = 'pending'
-- "my team's leaves" → Filter by e.manager_id = '{user.id}'::uuid
-- "leaves I approved" → Filter by approved_by = '{user.id}'::uuid
-
-Replace $CURRENT_USER_ID placeholder with '{user.id}' in generated SQL.
-"""
-            
-            # Create prompt for SQL generation with user context
-            prompt = f"""You are a SQL expert for an HRMS (Human Resource Management System) database. Generate a PostgreSQL query to answer the following question.
-
-⚠️ CRITICAL TABLE NAMING RULES - READ FIRST ⚠️
-The following table names DO NOT EXIST and must NEVER be used:
-- ❌ leave_requests → ✅ Use 'tr_leaves' instead
-- ❌ leaves → ✅ Use 'tr_leaves' instead
-- ❌ leave_applications → ✅ Use 'tr_leaves' instead
-- ❌ time_off → ✅ Use 'tr_leaves' instead
-- ❌ pto_requests → ✅ Use 'tr_leaves' instead
-
-CORRECT TABLE NAMES (use ONLY these):
-- tr_leaves: Leave requests and approvals (THE ONLY table for leave data)
-- employees: Employee master data
-- roles: Role definitions  
-- leave_types: Types of leaves (sick, vacation, etc.)
-- departments: Organization departments
-- permissions: Permission definitions
-- tr_role_permissions: Role-to-permission mappings
-
-The 'tr_' prefix indicates a TRANSACTION table.
-
-⚠️ CRITICAL RULES FOR MULTIPLE SQL STATEMENTS ⚠️
-If the question requires multiple queries (e.g., "show X and also Y"):
-1. Each SQL statement MUST be completely self-contained and independent
-2. DO NOT define a CTE (WITH clause) in one statement and reference it in another
-3. Each statement must include its own WITH clause if it needs a CTE
-4. Statements are executed separately - they cannot share CTEs or temporary tables
-
-Example of WRONG approach:
-```
-WITH data AS (SELECT ...) SELECT ... FROM data;  -- Statement 1 defines CTE
-SELECT ... FROM data;  -- Statement 2 FAILS - 'data' doesn't exist here!
-```
-
-Example of CORRECT approach:
-```
-WITH data AS (SELECT ...) SELECT ... FROM data;  -- Statement 1 with its own CTE
-WITH data AS (SELECT ...) SELECT ... FROM data;  -- Statement 2 with its own CTE (duplicated)
-```
-{user_context_info}
-
-Context (DDL, Examples, and Documentation):
-{context_str}
-
-Question: {question}
-
-Generate ONLY the SQL query, no explanations. Use ONLY the exact table names listed above.
-If the question is user-specific (contains "my", "I"), apply appropriate WHERE filters based on the current user context.
-If generating multiple statements, ensure each is completely self-contained."""
-            
+        )
+        
+        logger.info(f"📚 Retrieved {len(relevant_context)} context items from memory")
+        
+        # Build prompt with context - extract content from memory objects
+        context_items = []
+        for idx, item in enumerate(relevant_context):
+            content = _extract_content(item)
+            
+            if content:
+                context_items.append(f"Reference {idx+1}:\n{content}")
+                logger.debug("Context item %d: %.100s...", idx + 1, content)
+            else:
+                logger.warning(f"Could not extract content from item {idx+1}: {type(item).__name__}")
+        
+        if similar_example:
+            example_question, example_sql = similar_example
+            context_items.append(
+                f"Similar question answered earlier:\nQuestion: {example_question}\nSQL: {example_sql}"
+            )
+        
+        context_str = "\n\n".join(context_items)
+        
+        logger.info(f"Context string length: {len(context_str)} chars")
+        if logger.isEnabledFor(logging.DEBUG):
+            if len(context_str) > 500:
+                logger.debug("Context preview: %.500s...", context_str)
+            else:
+                logger.debug("Context: %s", context_str)
+        
+        # Build user context information for personalized queries
+        user_context_info = ""
+        if user and user.id not in self.user_resolver.SYSTEM_USER_IDS:
+            user_info = user.metadata
+            user_context_info = _USER_CONTEXT_TEMPLATE.format_map({
+                'user_id': user.id,
+                'role_name': user_info.get('role_name', 'employee'),
+                'role_level': user_info.get('role_level', 0),
+                'department_name': user_info.get('department_name', 'Unknown'),
+                'is_manager': user_info.get('is_manager', False),
+                'team_count': len(user_info.get('team_member_ids') or ())
+            })
+        
+        # Create prompt for SQL generation with user context; the header
+        # is precomputed per intent and only the middle section is formatted
+        prompt = (
+            f"{_PROMPT_HEADERS[_classify_intent(question)]}{user_context_info}\n\n"
+            f"Context (DDL, Examples, and Documentation):\n{context_str}\n\n"
+            f"Question: {question}\n\n{_PROMPT_FOOTER}"
+        )
+        
+        return SQLGenerationContext(
+            question=question,
+            context=context,
+            role=role,
+            user_id=user_id,
+            request_context=request_context,
+            user=user,
+            prompt=prompt,
+            context_item_count=len(relevant_context),
+            start_time=start_time
+        )
+    
+    async def generate_sql_from_context(
+        self,
+        ctx: SQLGenerationContext
+    ) -> Dict[str, Any]:
+        """
+        Phase 2 of generation: call the LLM and validate the returned SQL.
+        
+        Holds no database connection; the agent's own user lookup is a
+        brief acquire/release.
+        """
+        try:
             # Use agent to generate SQL - collect all UI components
             logger.info("🤖 Sending message to Vanna Agent...")
-            response_text = ""
+            response_parts: List[str] = []
             component_count = 0
             async for component in self.agent.send_message(
-                request_context=request_context,
-                message=prompt
+                request_context=ctx.request_context,
+                message=ctx.prompt
             ):
                 component_count += 1
-                component_type = type(component).__name__
                 
                 # Extract text from Vanna UiComponent
-                extracted = None
-                
-                # Vanna returns UiComponent with simple_component attribute
-                if hasattr(component, 'simple_component') and component.simple_component:
-                    simple = component.simple_component
-                    if hasattr(simple, 'text') and simple.text:
-                        extracted = str(simple.text)
-                        logger.debug(f"Component {component_count} (simple_component.text): {extracted[:100]}...")
-                
-                # Fallback: try direct text attributes
-                if not extracted:
-                    for attr in ['content', 'text', 'message', 'output', 'value']:
-                        if hasattr(component, attr):
-                            val = getattr(component, attr)
-                            if val and isinstance(val, (str, int, float)):
-                                extracted = str(val)
-                                logger.debug(f"Component {component_count} ({attr}): {extracted[:100]}...")
-                                break
-                
-                # Fallback: try model_dump
-                if not extracted and hasattr(component, 'model_dump'):
-                    data = component.model_dump()
-                    # Check simple_component in dumped data
-                    if 'simple_component' in data and data['simple_component']:
-                        sc = data['simple_component']
-                        if isinstance(sc, dict) and 'text' in sc:
-                            extracted = str(sc['text'])
-                            logger.debug(f"Component {component_count} (model_dump.simple_component.text): {extracted[:100]}...")
+                extracted = _component_text(component)
                 
                 if extracted:
-                    response_text += extracted + "\n"
+                    response_parts.append(extracted)
+                    logger.debug("Component %d: %.100s...", component_count, extracted)
                 else:
-                    logger.debug(f"Component {component_count} ({component_type}): No text content")
+                    logger.debug("Component %d (%s): No text content", component_count, type(component).__name__)
             
+            response_text = "\n".join(response_parts)
             logger.info(f"📨 Received {component_count} components, total length: {len(response_text)} chars")
-            logger.info(f"Raw response: {response_text}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Raw response: %s", response_text)
             
             # Check if response is empty
             if not response_text or not response_text.strip():
                 error_msg = "Agent returned empty response"
                 logger.error(f"❌ {error_msg}")
-                logger.error(f"Prompt was: {prompt}")
-                logger.error(f"Context items: {len(relevant_context)}")
+                logger.error(f"Prompt was: {ctx.prompt}")
+                logger.error(f"Context items: {ctx.context_item_count}")
                 return {
                     "success": False,
                     "error": error_msg,
                     "sql": "",
                     "debug_info": {
-                        "prompt_length": len(prompt),
-                        "context_items": len(relevant_context),
+                        "prompt_length": len(ctx.prompt),
+                        "context_items": ctx.context_item_count,
                         "component_count": component_count
                     }
                 }
@@ -821,9 +1206,10 @@ If generating multiple statements, ensure each is completely self-contained."""
             # Extract SQL from response
             sql = self._extract_sql_from_response(response_text)
             logger.info(f"📝 Extracted SQL length: {len(sql)} chars")
-            logger.info(f"Extracted SQL: {sql}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Extracted SQL: %s", sql)
             
-            execution_time = time.time() - start_time
+            execution_time = time.time() - ctx.start_time
             
             # Validate and sanitize SQL (basic validation)
             validation = self._validate_sql(sql)
@@ -837,16 +1223,16 @@ If generating multiple statements, ensure each is completely self-contained."""
                     "debug_info": {
                         "response_length": len(response_text),
                         "component_count": component_count,
-                        "context_items": len(relevant_context)
+                        "context_items": ctx.context_item_count
                     }
                 }
             
             # Security validation (role-based access, injection detection, placeholder replacement)
-            user_metadata = user.metadata if user else {}
+            user_metadata = ctx.user.metadata if ctx.user else {}
             security_result = self.security_validator.validate(
                 sql=sql,
-                user_id=user_id,
-                role=user_metadata.get('role_name', role),
+                user_id=ctx.user_id,
+                role=user_metadata.get('role_name', ctx.role),
                 user_metadata=user_metadata
             )
             
@@ -881,7 +1267,7 @@ If generating multiple statements, ensure each is completely self-contained."""
                 "success": True,
                 "sql": validated_sql,
                 "execution_time": execution_time,
-                "explanation": f"Generated SQL for: {question}",
+                "explanation": f"Generated SQL for: {ctx.question}",
                 "metadata": {
                     "security_validated": True,
                     "role_level": security_result.role_level,
@@ -889,7 +1275,7 @@ If generating multiple statements, ensure each is completely self-contained."""
                     "modifications": security_result.modifications
                 }
             }
-            
+        
         except Exception as e:
             logger.error(f"❌ SQL generation failed: {e}")
             return {
@@ -917,49 +1303,14 @@ If generating multiple statements, ensure each is completely self-contained."""
     def _split_sql_statements(self, sql: str) -> List[str]:
         """
         Split SQL string into individual statements.
-        Handles semicolons inside strings properly.
-        Strips leading comments from each statement.
-        """
-        statements = []
-        current_statement = ""
-        in_string = False
-        string_char = None
-        
-        i = 0
-        while i < len(sql):
-            char = sql[i]
-            
-            # Handle string boundaries
-            if char in ("'", '"') and (i == 0 or sql[i-1] != '\\'):
-                if not in_string:
-                    in_string = True
-                    string_char = char
-                elif char == string_char:
-                    in_string = False
-                    string_char = None
-            
-            # Split on semicolon if not in string
-            if char == ';' and not in_string:
-                stmt = current_statement.strip()
-                if stmt:
-                    # Check if statement has actual SQL (not just comments)
-                    stripped = self._strip_sql_comments(stmt)
-                    if stripped:
-                        statements.append(stmt)  # Keep original with comments for context
-                current_statement = ""
-            else:
-                current_statement += char
-            
-            i += 1
+        Handles semicolons inside strings, quoted identifiers, comments and
+        dollar-quoted bodies properly (one regex scan, no per-char loop).
+        Drops statements that are only comments.
         
-        # Don't forget the last statement (may not have trailing semicolon)
-        stmt = current_statement.strip()
-        if stmt:
-            stripped = self._strip_sql_comments(stmt)
-            if stripped:
-                statements.append(stmt)
-        
-        return statements
+        Results are cached, so validation, the read-only check and
+        execution of the same generated SQL split it only once.
+        """
+        return list(_split_statements(sql))
     
     async def generate_and_execute_sql(
         self,
@@ -967,9 +1318,15 @@ If generating multiple statements, ensure each is completely self-contained."""
         context: Optional[str] = None,
         role: Optional[str] = None,
         user_id: Optional[str] = None,
-        max_rows: Optional[int] = None
+        max_rows: Optional[int] = None,
+        result_format: str = "records"
     ) -> Dict[str, Any]:
-        """Generate SQL and execute it with user context. Supports multiple SQL statements."""
+        """
+        Generate SQL and execute it with user context. Supports multiple SQL statements.
+        
+        result_format "columnar" returns SELECT rows as value lists alongside
+        "columns"; "records" (default) returns one dict per row.
+        """
         
         # Generate SQL with user context
         result = await self.generate_sql(question, context, role, user_id)
@@ -977,6 +1334,29 @@ If generating multiple statements, ensure each is completely self-contained."""
         if not result['success']:
             return result
         
+        return await self.execute_prepared(
+            result, max_rows=max_rows, result_format=result_format, user_id=user_id
+        )
+    
+    async def execute_prepared(
+        self,
+        result: Dict[str, Any],
+        max_rows: Optional[int] = None,
+        result_format: str = "records",
+        user_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Phase 3: execute SQL from a successful generation result.
+        
+        Acquires a fresh pool connection only for the execution itself.
+        
+        Args:
+            result: Successful result from generate_sql / generate_sql_from_context
+            max_rows: Maximum rows to return
+            result_format: "records" or "columnar" (see generate_and_execute_sql)
+            user_id: User the SQL was generated for; their id is bound as a
+                parameter rather than executed inline (see _bind_user_id)
+        """
         sql = result['sql']
         
         # Split into multiple statements if present
@@ -991,12 +1371,15 @@ If generating multiple statements, ensure each is completely self-contained."""
                 original_sql=sql,
                 generation_time=result.get('execution_time', 0),
                 max_rows=max_rows,
-                metadata=result.get('metadata')
+                metadata=result.get('metadata'),
+                result_format=result_format,
+                user_id=user_id
             )
         
         # Single statement execution (original logic)
         # Determine operation type
         operation_type = self._get_operation_type(sql)
+        bound_sql, args = _bind_user_id(sql, user_id)
         
         try:
             start_time = time.time()
@@ -1004,15 +1387,21 @@ If generating multiple statements, ensure each is completely self-contained."""
             # Execute based on operation type
             if operation_type in ['SELECT']:
                 # Read operation
-                rows = await db_manager.execute_query(
-                    sql, 
-                    max_rows=max_rows or settings.MAX_QUERY_RESULTS
+                result_set = await db_manager.execute_query(
+                    bound_sql, 
+                    max_rows=max_rows or settings.MAX_QUERY_RESULTS,
+                    args=args
                 )
                 execution_time = time.time() - start_time
                 
+                columns, rows = result_set["columns"], result_set["rows"]
+                if result_format != "columnar":
+                    rows = rows_to_records(columns, rows)
+                
                 return {
                     "success": True,
                     "sql": sql,
+                    "columns": columns,
                     "results": rows,
                     "row_count": len(rows),
                     "execution_time": result['execution_time'] + execution_time,
@@ -1020,10 +1409,10 @@ If generating multiple statements, ensure each is completely self-contained."""
                     "explanation": result.get('explanation'),
                     "metadata": result.get('metadata')
                 }
-                
+            
             elif operation_type in ['INSERT', 'UPDATE', 'DELETE']:
                 # Write operation
-                write_result = await db_manager.execute_write_query(sql)
+                write_result = await db_manager.execute_write_query(bound_sql, args)
                 execution_time = time.time() - start_time
                 
                 return {
@@ -1042,7 +1431,7 @@ If generating multiple statements, ensure each is completely self-contained."""
                     "error": f"Unsupported operation type: {operation_type}",
                     "sql": sql
                 }
-                
+        
         except Exception as e:
             logger.error(f"❌ SQL execution failed: {e}")
             return {
@@ -1057,7 +1446,9 @@ If generating multiple statements, ensure each is completely self-contained."""
         original_sql: str,
         generation_time: float,
         max_rows: Optional[int] = None,
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        result_format: str = "records",
+        user_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Execute multiple SQL statements and return combined results.
@@ -1068,21 +1459,40 @@ If generating multiple statements, ensure each is completely self-contained."""
             generation_time: Time taken to generate SQL
             max_rows: Maximum rows per query
             metadata: Security metadata from generation
-            
+            result_format: "records" or "columnar" row layout per query
+            user_id: User id bound as a parameter in each statement
+        
         Returns:
             Combined results with query_results array
         """
         try:
             start_time = time.time()
             
+            # Independent SELECTs run concurrently on separate connections
+            # (a WITH that modifies data is classified as its write);
+            # pure write batches run all-or-nothing in one transaction; mixed
+            # batches keep statement order on one connection
+            operations = [self._get_operation_type(stmt) for stmt in sql_statements]
+            parallel = all(op == 'SELECT' for op in operations)
+            atomic = all(op in ('INSERT', 'UPDATE', 'DELETE') for op in operations)
+            
+            bound = [_bind_user_id(stmt, user_id) for stmt in sql_statements]
+            
             # Execute all statements
             query_results = await db_manager.execute_multiple_queries(
-                sql_statements,
-                max_rows=max_rows or settings.MAX_QUERY_RESULTS
+                [stmt for stmt, _ in bound],
+                max_rows=max_rows or settings.MAX_QUERY_RESULTS,
+                parallel=parallel,
+                atomic=atomic,
+                args=[stmt_args for _, stmt_args in bound]
             )
             
             execution_time = time.time() - start_time
             
+            if result_format != "columnar":
+                for qr in query_results:
+                    qr["rows"] = rows_to_records(qr["columns"], qr["rows"])
+            
             # Calculate totals
             total_rows = sum(qr.get('row_count', 0) for qr in query_results)
             successful_queries = sum(1 for qr in query_results if qr.get('success'))
@@ -1107,7 +1517,7 @@ If generating multiple statements, ensure each is completely self-contained."""
                 "explanation": f"Executed {len(query_results)} SQL statements",
                 "metadata": metadata
             }
-            
+        
         except Exception as e:
             logger.error(f"❌ Multiple statement execution failed: {e}")
             return {
@@ -1117,17 +1527,46 @@ If generating multiple statements, ensure each is completely self-contained."""
                 "metadata": metadata
             }
     
+    def is_single_select(self, sql: str) -> bool:
+        """Check whether sql is exactly one SELECT statement"""
+        statements = self._split_sql_statements(sql)
+        return len(statements) == 1 and self._get_operation_type(statements[0]) == 'SELECT'
+    
+    def bind_user_id(self, sql: str, user_id: Optional[str]) -> Tuple[str, Tuple[Any, ...]]:
+        """Parameterize the user's id in sql for execution (see _bind_user_id)"""
+        return _bind_user_id(sql, user_id)
+    
+    def is_read_only_sql(self, sql: str) -> bool:
+        """
+        Check whether every statement in sql is a SELECT, and so safe to
+        cache and replay. A WITH that modifies data is its write, not a read.
+        """
+        statements = self._split_sql_statements(sql)
+        return bool(statements) and all(
+            self._get_operation_type(stmt) == 'SELECT' for stmt in statements
+        )
+    
     def _validate_sql(self, sql: str) -> Dict[str, Any]:
         """Validate generated SQL"""
         if not sql or not sql.strip():
             return {"valid": False, "error": "Empty SQL generated"}
         
-        # Check for dangerous operations (configurable)
-        dangerous_keywords = ['DROP', 'TRUNCATE', 'ALTER']
-        sql_upper = sql.upper()
+        # Check for dangerous operations (configurable), first as whole words
+        # anywhere in the text (no false hits such as "altered_at")
+        for match in _DANGEROUS_KEYWORD_RE.finditer(sql):
+            keyword = match.group(1).upper()
+            if keyword not in settings.ALLOWED_OPERATIONS:
+                return {
+                    "valid": False,
+                    "error": f"Dangerous operation '{keyword}' not allowed"
+                }
+        
+        # Then by the leading keyword of every statement that will be executed
+        statements = self._split_sql_statements(sql)
+        keywords = [sql_operation(statement) for statement in statements]
         
-        for keyword in dangerous_keywords:
-            if keyword in sql_upper:
+        for keyword in keywords:
+            if keyword in _DANGEROUS_KEYWORDS:
                 # Check if it's in ALLOWED_OPERATIONS
                 if keyword not in settings.ALLOWED_OPERATIONS:
                     return {
@@ -1135,8 +1574,9 @@ If generating multiple statements, ensure each is completely self-contained."""
                         "error": f"Dangerous operation '{keyword}' not allowed"
                     }
         
-        # Check if operation is allowed
-        operation = self._get_operation_type(sql)
+        # Check if operation is allowed (a WITH that modifies data counts as
+        # that write)
+        operation = self._get_operation_type(statements[0]) if statements else 'UNKNOWN'
         if operation not in settings.ALLOWED_OPERATIONS:
             return {
                 "valid": False,
@@ -1150,47 +1590,24 @@ If generating multiple statements, ensure each is completely self-contained."""
         Strip SQL comments from the beginning of SQL statements.
         Handles both single-line (--) and multi-line (/* */) comments.
         """
-        sql = sql.strip()
-        
-        while sql:
-            # Skip single-line comments
-            if sql.startswith('--'):
-                newline_idx = sql.find('\n')
-                if newline_idx == -1:
-                    return ''  # Entire SQL is a comment
-                sql = sql[newline_idx + 1:].strip()
-            # Skip multi-line comments
-            elif sql.startswith('/*'):
-                end_idx = sql.find('*/')
-                if end_idx == -1:
-                    return ''  # Unclosed comment
-                sql = sql[end_idx + 2:].strip()
-            else:
-                break
-        
-        return sql
+        return _strip_leading_comments(sql)
     
     def _get_operation_type(self, sql: str) -> str:
-        """Extract operation type from SQL, ignoring leading comments"""
-        # Strip comments before checking operation type
-        sql_clean = self._strip_sql_comments(sql).upper()
-        
-        if sql_clean.startswith('SELECT') or sql_clean.startswith('WITH'):
-            return 'SELECT'
-        elif sql_clean.startswith('INSERT'):
-            return 'INSERT'
-        elif sql_clean.startswith('UPDATE'):
-            return 'UPDATE'
-        elif sql_clean.startswith('DELETE'):
-            return 'DELETE'
-        elif sql_clean.startswith('DROP'):
-            return 'DROP'
-        elif sql_clean.startswith('ALTER'):
-            return 'ALTER'
-        elif sql_clean.startswith('TRUNCATE'):
-            return 'TRUNCATE'
-        else:
-            return 'UNKNOWN'
+        """
+        Extract operation type from SQL, ignoring leading comments.
+        
+        A WITH whose CTEs or main statement modify data is that write
+        (e.g. WITH d AS (DELETE ... RETURNING *) SELECT ... is a DELETE).
+        """
+        keyword = sql_operation(sql)
+        if keyword == 'WITH':
+            keyword = with_write_keyword(sql) or keyword
+        return self._operation_from_keyword(keyword)
+    
+    @staticmethod
+    def _operation_from_keyword(keyword: str) -> str:
+        """Map a leading SQL keyword to its operation type"""
+        return _OPERATION_TYPES.get(keyword, 'UNKNOWN')
     
     def _generate_sample_questions(
         self, 
@@ -1243,23 +1660,23 @@ If generating multiple statements, ensure each is completely self-contained."""
     
     # Helper methods to parse DATABASE_URL
     def _extract_host(self, url: str) -> str:
-        match = re.search(r'@([^:]+):', url)
+        match = _URL_HOST_RE.search(url)
         return match.group(1) if match else 'localhost'
     
     def _extract_port(self, url: str) -> int:
-        match = re.search(r':(\d+)/', url)
+        match = _URL_PORT_RE.search(url)
         return int(match.group(1)) if match else 5432
     
     def _extract_dbname(self, url: str) -> str:
-        match = re.search(r'/([^?]+)', url)
+        match = _URL_DBNAME_RE.search(url)
         return match.group(1) if match else 'postgres'
     
     def _extract_user(self, url: str) -> str:
-        match = re.search(r'://([^:]+):', url)
+        match = _URL_USER_RE.search(url)
         return match.group(1) if match else 'postgres'
     
     def _extract_password(self, url: str) -> str:
-        match = re.search(r':([^@]+)@', url)
+        match = _URL_PASSWORD_RE.search(url)
         return match.group(1) if match else ''
 
 
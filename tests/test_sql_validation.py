@@ -0,0 +1,140 @@
+"""
+Statement splitting, dangerous-operation checks and row limits for
+generated SQL.
+
+Run with: python -m unittest discover tests
+"""
+import os
+import time
+import unittest
+
+# Settings are read at import; the validator needs no live services
+os.environ.setdefault("DATABASE_URL", "postgresql://test@localhost/test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from app.database import DatabaseManager  # noqa: E402
+from app.services.sql_validator import sql_operation  # noqa: E402
+from app.services.vanna_service import VannaSQLService, _split_statements  # noqa: E402
+
+
+class SplitStatementsTest(unittest.TestCase):
+
+    def test_quoted_semicolon_stays_in_statement(self):
+        self.assertEqual(
+            _split_statements("SELECT 'a;b' FROM t; SELECT 1"),
+            ("SELECT 'a;b' FROM t", "SELECT 1")
+        )
+    
+    def test_backslash_does_not_escape_quote_in_standard_string(self):
+        # standard_conforming_strings: the string ends at the second quote
+        self.assertEqual(
+            _split_statements("SELECT 'x\\'; DROP TABLE employees; --'\nSELECT 1"),
+            ("SELECT 'x\\'", "DROP TABLE employees", "--'\nSELECT 1")
+        )
+    
+    def test_backslash_escapes_quote_in_e_string(self):
+        self.assertEqual(
+            _split_statements("SELECT E'x\\'; y'; SELECT 1"),
+            ("SELECT E'x\\'; y'", "SELECT 1")
+        )
+    
+    def test_doubled_quote_is_escaped(self):
+        self.assertEqual(
+            _split_statements("SELECT 'it''s; fine'; SELECT 1"),
+            ("SELECT 'it''s; fine'", "SELECT 1")
+        )
+
+
+class SQLOperationTest(unittest.TestCase):
+
+    def test_leading_comments_are_skipped(self):
+        self.assertEqual(sql_operation("  -- note\n /* x */\n  select 1"), "SELECT")
+    
+    def test_long_whitespace_run_without_keyword_is_fast(self):
+        start = time.perf_counter()
+        self.assertEqual(sql_operation(" " * 5000 + "(SELECT 1) UNION (SELECT 2)"), "")
+        self.assertEqual(sql_operation("/* c */ " * 2000 + "("), "")
+        self.assertLess(time.perf_counter() - start, 1.0)
+
+
+class ValidateSQLTest(unittest.TestCase):
+
+    def setUp(self):
+        # _validate_sql needs no agent, memory or database
+        self.service = VannaSQLService.__new__(VannaSQLService)
+    
+    def test_drop_after_backslash_quote_is_rejected(self):
+        sql = (
+            "UPDATE tr_leaves SET reason = 'x\\'; DROP TABLE employees; --' WHERE id = 1;\n"
+            "UPDATE tr_leaves SET status = 'a' WHERE id = 2"
+        )
+        result = self.service._validate_sql(sql)
+        self.assertFalse(result["valid"])
+        self.assertIn("DROP", result["error"])
+    
+    def test_dangerous_keyword_inside_literal_is_rejected(self):
+        # The full-text scan does not depend on the splitter
+        result = self.service._validate_sql("SELECT * FROM t WHERE note = 'a;drop table t'")
+        self.assertFalse(result["valid"])
+    
+    def test_data_modifying_cte_is_a_write(self):
+        self.assertEqual(
+            self.service._get_operation_type(
+                "WITH d AS (DELETE FROM t WHERE id = 1 RETURNING *) SELECT * FROM d"
+            ),
+            "DELETE"
+        )
+        self.assertEqual(
+            self.service._get_operation_type("WITH x AS (SELECT 1) INSERT INTO t SELECT * FROM x"),
+            "INSERT"
+        )
+        self.assertEqual(
+            self.service._get_operation_type("WITH x AS (SELECT 1) SELECT * FROM x"),
+            "SELECT"
+        )
+    
+    def test_data_modifying_cte_is_not_read_only(self):
+        self.assertFalse(self.service.is_read_only_sql(
+            "WITH d AS (UPDATE tr_leaves SET status = 'x' RETURNING id) SELECT * FROM d"
+        ))
+        self.assertFalse(self.service.is_read_only_sql(
+            "SELECT 1; WITH x AS (SELECT 1) DELETE FROM t WHERE id IN (SELECT * FROM x)"
+        ))
+        self.assertTrue(self.service.is_read_only_sql(
+            "WITH x AS (SELECT 'delete' AS a) SELECT * FROM x; SELECT 1"
+        ))
+    
+    def test_keyword_as_part_of_identifier_is_allowed(self):
+        result = self.service._validate_sql("SELECT altered_at, dropped FROM t; SELECT 1")
+        self.assertTrue(result["valid"])
+
+
+
+class AddLimitClauseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = DatabaseManager.__new__(DatabaseManager)
+    
+    def test_read_only_cte_is_wrapped(self):
+        sql = self.manager._add_limit_clause("WITH d AS (SELECT 1) SELECT * FROM d;", 10)
+        self.assertTrue(sql.startswith("SELECT * FROM (\n"))
+        self.assertTrue(sql.endswith("LIMIT 10"))
+    
+    def test_data_modifying_cte_is_not_wrapped(self):
+        for sql in (
+            "WITH d AS (DELETE FROM t WHERE id = 1 RETURNING *) SELECT * FROM d",
+            "WITH x AS MATERIALIZED (SELECT 1 AS id) INSERT INTO t SELECT id FROM x",
+            "WITH d AS (\n  -- archive\n  update t SET a = 'x' RETURNING id\n) SELECT id FROM d",
+        ):
+            self.assertEqual(self.manager._add_limit_clause(sql, 10), sql)
+    
+    def test_write_keyword_in_literal_or_locking_clause_is_ignored(self):
+        for sql in (
+            "WITH d AS (SELECT '(delete' AS a) SELECT * FROM d",
+            "WITH d AS (SELECT * FROM t FOR UPDATE) SELECT * FROM d",
+        ):
+            self.assertIn("_vanna_limited", self.manager._add_limit_clause(sql, 10))
+
+
+if __name__ == "__main__":
+    unittest.main()